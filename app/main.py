@@ -3,24 +3,300 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import html
+import json
 import os
+import queue
+import re
 import sqlite3
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncIterator, Callable, Hashable, Iterator, Optional
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from app.metrics import Registry
+from scripts.quran_refs import parse_verse_ref
+from scripts.search_text import match_key, match_query, query_terms, token_spans
+
 
 ROOT = Path(__file__).resolve().parents[1]
 WEB_DIR = ROOT / "web"
 DB_PATH = Path(os.getenv("QURANQA_DB_PATH", r"D:\IslamQAScraping\quranqa.sqlite3"))
 
-app = FastAPI(title="QuranQA")
+# Filtered totals are cached per (topic, q) and reused while the DB generation is
+# unchanged; `total=approx` also accepts an entry up to COUNT_APPROX_TTL old.
+COUNT_CACHE_SIZE = 1024
+COUNT_APPROX_TTL = 300.0
+
+# Serialised GET responses, keyed by endpoint + params and tagged with the DB
+# generation they were built from; a generation bump makes every entry stale.
+# Feedback does not bump it: a fatwa's detail entry is also tagged with its
+# newest feedback id, so a comment only invalidates that one entry.
+RESPONSE_CACHE_SIZE = 4096
+RESPONSE_CACHE_TTL = 3600.0
+
+# /api/export streams rows in chunks of EXPORT_CHUNK_ROWS from a connection of its own.
+# Columns an older DB lacks are left out; `since` falls back to generated_at_unix
+# there (build_sqlite_db.py adds and backfills updated_at_unix on its next run).
+EXPORT_CHUNK_ROWS = 500
+EXPORT_COLUMNS = [
+    "id", "url", "title", "question_summary", "source_answer", "raw_text", "topic",
+    "draft_fatwa_text", "quran_references_json", "principles_json", "madhhab",
+    "source_org", "canonical_url", "topic_confidence", "generated_at_unix",
+    "scraped_at_unix", "created_at_unix", "updated_at_unix",
+]
+
+READ_POOL_SIZE = int(os.getenv("QURANQA_READ_POOL_SIZE", "16"))
+READ_PRAGMAS = {
+    "mmap_size": 512 * 1024 * 1024,
+    "cache_size": -65536,
+    "query_only": 1,
+}
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Feedback is group-committed, so a full fsync per commit is cheap.
+    "synchronous": "FULL",
+    "busy_timeout": 5000,
+}
+
+# Feedback is queued and committed in batches of up to FEEDBACK_BATCH_SIZE; an
+# entry waits at most FEEDBACK_MAX_DELAY for companions before its batch commits.
+# A full queue makes requests wait up to FEEDBACK_ENQUEUE_TIMEOUT, then 503.
+FEEDBACK_QUEUE_SIZE = 2048
+FEEDBACK_BATCH_SIZE = 256
+FEEDBACK_MAX_DELAY = 0.05
+FEEDBACK_ENQUEUE_TIMEOUT = 2.0
+
+
+METRICS = Registry()
+HTTP_REQUESTS = METRICS.counter(
+    "quranqa_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = METRICS.histogram(
+    "quranqa_http_request_duration_seconds",
+    "Time from request start until the response body finished sending.",
+    ("method", "route"),
+)
+HTTP_EXCEPTIONS = METRICS.counter(
+    "quranqa_http_exceptions_total", "Unhandled exceptions raised by route handlers.", ("route", "exception")
+)
+SQL_LATENCY = METRICS.histogram(
+    "quranqa_sql_statement_duration_seconds",
+    "SQLite execute() time (through the first result row), by statement verb and table.",
+    ("statement",),
+)
+SQL_ERRORS = METRICS.counter("quranqa_sql_errors_total", "SQLite statements that raised.", ("statement",))
+POOL_WAIT = METRICS.histogram(
+    "quranqa_read_pool_wait_seconds", "Time requests waited for a read connection when none was idle."
+)
+CACHE_LOOKUPS = METRICS.counter("quranqa_cache_lookups_total", "In-process cache lookups.", ("cache", "result"))
+CACHE_EVICTIONS = METRICS.counter("quranqa_cache_evictions_total", "Entries dropped by LRU size limits.", ("cache",))
+FEEDBACK_BATCH = METRICS.histogram(
+    "quranqa_feedback_batch_size", "Comments per group commit.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+FEEDBACK_REJECTED = METRICS.counter(
+    "quranqa_feedback_rejected_total", "Feedback not committed, by reason.", ("reason",)
+)
+
+_SQL_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def statement_label(sql: str) -> str:
+    """Low-cardinality name for a statement: its verb and first table, e.g. "select fatawa_fts"."""
+    words = sql.split(None, 1)
+    verb = words[0].lower() if words else ""
+    m = _SQL_TABLE_RE.search(sql)
+    return f"{verb} {m.group(1).lower()}" if m else verb
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose execute()/executemany() calls feed SQL_LATENCY and SQL_ERRORS."""
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error:
+            SQL_ERRORS.labels(statement_label(sql)).inc()
+            raise
+        finally:
+            SQL_LATENCY.labels(statement_label(sql)).observe(time.perf_counter() - started)
+
+    def executemany(self, sql: str, parameters: Any, /) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        except sqlite3.Error:
+            SQL_ERRORS.labels(statement_label(sql)).inc()
+            raise
+        finally:
+            SQL_LATENCY.labels(statement_label(sql)).observe(time.perf_counter() - started)
+
+
+class ReadPool:
+    """Per-process pool of read-only connections, each lent to one request at a time.
+
+    Connections keep their page cache and mmap between requests. They are
+    opened lazily, up to `size`; further callers wait for one to be returned.
+    """
+
+    def __init__(self, path: Path, size: int) -> None:
+        self.path = path
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def open(self) -> sqlite3.Connection:
+        """A new connection with the pool's settings, not counted against `size`."""
+        conn = sqlite3.connect(
+            f"{self.path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False, factory=TimedConnection
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in READ_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._opened < self.size
+                if grow:
+                    self._opened += 1
+            if grow:
+                try:
+                    conn = self.open()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                conn = self._idle.get()
+                POOL_WAIT.observe(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @property
+    def opened(self) -> int:
+        return self._opened
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class Writer:
+    """The process's single write connection; `connection()` serialises its users."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.path, check_same_thread=False, factory=TimedConnection)
+                conn.row_factory = sqlite3.Row
+                for name, value in WRITE_PRAGMAS.items():
+                    conn.execute(f"PRAGMA {name}={value}")
+                self._conn = conn
+            yield self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+READ_POOL = ReadPool(DB_PATH, READ_POOL_SIZE)
+WRITER = Writer(DB_PATH)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    FEEDBACK.start()
+    try:
+        yield
+    finally:
+        await FEEDBACK.stop()
+        WRITER.close()
+        READ_POOL.close()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_REQUESTS/HTTP_LATENCY per route template (not raw path)."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exc:
+            HTTP_EXCEPTIONS.labels(route_label(scope), type(exc).__name__).inc()
+            raise
+        finally:
+            route = route_label(scope)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status)).inc()
+            HTTP_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+
+
+def route_label(scope: dict) -> str:
+    """Matched route template; mounts (static files) report their prefix, unmatched paths share one label."""
+    path = getattr(scope.get("route"), "path", None)
+    if path:
+        return path
+    if "endpoint" in scope and scope.get("root_path"):
+        return scope["root_path"]
+    return "unmatched"
+
+
+app = FastAPI(title="QuranQA", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,15 +304,136 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 app.mount("/web", StaticFiles(directory=str(WEB_DIR)), name="web")
 
 
-def get_conn() -> sqlite3.Connection:
+@contextmanager
+def read_conn() -> Iterator[sqlite3.Connection]:
+    if not DB_PATH.exists():
+        raise HTTPException(status_code=500, detail=f"DB not found: {DB_PATH}")
+    with READ_POOL.connection() as conn:
+        yield conn
+
+
+@contextmanager
+def write_conn() -> Iterator[sqlite3.Connection]:
     if not DB_PATH.exists():
         raise HTTPException(status_code=500, detail=f"DB not found: {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    with WRITER.connection() as conn:
+        yield conn
+
+
+_count_cache: OrderedDict[tuple, tuple[int, int, float]] = OrderedDict()
+_count_lock = threading.Lock()
+
+
+def db_generation(conn: sqlite3.Connection) -> int:
+    """Generation from db_meta; DB/WAL mtimes stand in on DBs built before it existed."""
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row:
+        return row[0]
+    wal = DB_PATH.with_name(DB_PATH.name + "-wal")
+    return max(DB_PATH.stat().st_mtime_ns, wal.stat().st_mtime_ns if wal.exists() else 0)
+
+
+def cached_count(conn: sqlite3.Connection, key: tuple, mode: str, sql: str, params: list) -> Optional[int]:
+    if mode == "none":
+        return None
+    generation = db_generation(conn)
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit is not None:
+            _count_cache.move_to_end(key)
+    if hit is not None and (hit[0] == generation or (mode == "approx" and now - hit[2] < COUNT_APPROX_TTL)):
+        CACHE_LOOKUPS.labels("count", "hit").inc()
+        return hit[1]
+    CACHE_LOOKUPS.labels("count", "miss").inc()
+    n = conn.execute(sql, params).fetchone()[0]
+    with _count_lock:
+        _count_cache[key] = (generation, n, now)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+            CACHE_EVICTIONS.labels("count").inc()
+    return n
+
+
+@dataclass
+class CachedResponse:
+    generation: Hashable
+    stored_at: float
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """Bounded LRU of serialised JSON bodies, valid while the DB generation is unchanged."""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, generation: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.generation != generation or time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, generation: Hashable, payload: dict) -> CachedResponse:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entry = CachedResponse(generation, time.monotonic(), body, f'"{hashlib.sha1(body).hexdigest()}"')
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels("response").inc()
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def cached_json(
+    request: Request,
+    key: tuple,
+    build: Callable[[sqlite3.Connection], dict],
+    version: Optional[Callable[[sqlite3.Connection], Hashable]] = None,
+) -> Response:
+    """Serve `build(conn)` through RESPONSE_CACHE, answering If-None-Match with 304.
+
+    Entries are valid for the DB generation plus `version(conn)`, for data
+    that changes without a generation bump. `Cache-Control: no-cache` lets
+    browsers and proxies keep the body but makes them revalidate, so a rebuild
+    or new feedback is visible on the next request.
+    """
+    with read_conn() as conn:
+        generation = db_generation(conn)
+        if version is not None:
+            generation = (generation, version(conn))
+        entry = RESPONSE_CACHE.get(key, generation)
+        CACHE_LOOKUPS.labels("response", "miss" if entry is None else "hit").inc()
+        if entry is None:
+            entry = RESPONSE_CACHE.put(key, generation, build(conn))
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 
 class FeedbackIn(BaseModel):
@@ -44,29 +441,286 @@ class FeedbackIn(BaseModel):
     comment: str
 
 
+class FeedbackWriter:
+    """Write-behind queue that group-commits feedback on the writer connection.
+
+    `submit` resolves once the entry's batch has committed (True) or was
+    skipped because the fatwa does not exist (False), so callers still get an
+    accurate answer while concurrent submissions share one transaction.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int, max_delay: float) -> None:
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Commit everything already queued, then end the writer task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, fatwa_id: int, comment: str, timeout: float) -> bool:
+        if self._task is None:
+            raise HTTPException(status_code=503, detail="feedback writer is not running")
+        done = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((fatwa_id, comment, int(time.time()), done)), timeout)
+        except asyncio.TimeoutError:
+            FEEDBACK_REJECTED.labels("queue_full").inc()
+            raise HTTPException(status_code=503, detail="feedback queue is full", headers={"Retry-After": "1"})
+        return await done
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            FEEDBACK_BATCH.observe(len(batch))
+            try:
+                inserted = await asyncio.to_thread(self._commit, [entry[:3] for entry in batch])
+            except Exception as exc:
+                FEEDBACK_REJECTED.labels("commit_error").inc(len(batch))
+                for *_, done in batch:
+                    if not done.done():
+                        done.set_exception(exc)
+                continue
+            for ok, (*_, done) in zip(inserted, batch):
+                # A request that was cancelled (client went away) has already given up on its future.
+                if not done.done():
+                    done.set_result(ok)
+
+    @staticmethod
+    def _commit(rows: list[tuple[int, str, int]]) -> list[bool]:
+        inserted = []
+        with write_conn() as conn, conn:
+            for fatwa_id, comment, created_at_unix in rows:
+                cur = conn.execute(
+                    """
+                    INSERT INTO feedback (fatwa_id, comment, created_at_unix)
+                    SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM fatawa WHERE id = ?)
+                    """,
+                    (fatwa_id, comment, created_at_unix, fatwa_id),
+                )
+                inserted.append(cur.rowcount == 1)
+        return inserted
+
+
+FEEDBACK = FeedbackWriter(FEEDBACK_QUEUE_SIZE, FEEDBACK_BATCH_SIZE, FEEDBACK_MAX_DELAY)
+
+METRICS.gauge_callback(
+    "quranqa_read_pool_connections",
+    "Read connections by state; `limit` is QURANQA_READ_POOL_SIZE.",
+    lambda: [(("open",), READ_POOL.opened), (("idle",), READ_POOL.idle), (("limit",), READ_POOL.size)],
+    ("state",),
+)
+METRICS.gauge_callback(
+    "quranqa_cache_entries",
+    "Entries held by each in-process cache.",
+    lambda: [(("response",), len(RESPONSE_CACHE)), (("count",), len(_count_cache))],
+    ("cache",),
+)
+METRICS.gauge_callback("quranqa_feedback_queue_depth", "Feedback waiting for a group commit.", lambda: FEEDBACK.depth)
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus text exposition of this worker process's metrics."""
+    return Response(content=METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/")
 def index() -> FileResponse:
     return FileResponse(WEB_DIR / "index.html")
 
 
 @app.get("/api/topics")
-def topics() -> dict:
-    conn = get_conn()
+def topics(request: Request) -> Response:
+    return cached_json(request, ("topics",), topics_payload)
+
+
+def topics_payload(conn: sqlite3.Connection) -> dict:
     rows = conn.execute(
         "SELECT topic, COUNT(*) AS n FROM fatawa GROUP BY topic ORDER BY n DESC"
     ).fetchall()
-    conn.close()
     return {"topics": [{"topic": r["topic"], "count": r["n"]} for r in rows]}
 
 
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    return has_table(conn, "fatawa_fts")
+
+
+# Tokens per search snippet, as FTS5 snippet() was called with before.
+SNIPPET_TOKENS = 16
+
+
+def highlight_snippet(texts: list[Optional[str]], terms: list[str], size: int = SNIPPET_TOKENS) -> str:
+    """HTML snippet of the stored (unfolded) text around the best run of query matches.
+
+    Like FTS5 snippet(): the `size`-token window with the most distinct matched
+    terms wins, earlier columns first. The text is escaped and matched tokens
+    are wrapped in <mark>.
+    """
+    best_score, best = None, None
+    for text in texts:
+        spans = token_spans(text or "")
+        if not spans:
+            continue
+        hits = [i for i, (_, _, token) in enumerate(spans) if any(match_key(token).startswith(t) for t in terms)]
+        for i in hits or [0]:
+            start = max(0, min(i - 2, len(spans) - size))
+            window = [h for h in hits if start <= h < start + size]
+            found = {t for h in window for t in terms if match_key(spans[h][2]).startswith(t)}
+            score = (len(found), len(window))
+            if best_score is None or score > best_score:
+                best_score, best = score, (text, spans, start, set(window))
+    if best is None:
+        return ""
+    text, spans, start, marked = best
+    stop = min(start + size, len(spans))
+    parts = ["…"] if start else []
+    pos = spans[start][0] if start else 0
+    for i in range(start, stop):
+        token_start, token_end, _ = spans[i]
+        parts.append(html.escape(text[pos:token_start]))
+        token = html.escape(text[token_start:token_end])
+        parts.append(f"<mark>{token}</mark>" if i in marked else token)
+        pos = token_end
+    parts.append(html.escape(text[pos:]) if stop == len(spans) else "…")
+    return "".join(parts)
+
+
+def search_fatawa(
+    conn: sqlite3.Connection,
+    match: str,
+    terms: list[str],
+    topic: Optional[str],
+    canonical_only: bool,
+    limit: int,
+    offset: int,
+    total_mode: str,
+) -> dict:
+    """Rank FTS matches with bm25 (title weighted highest) and attach a highlighted snippet.
+
+    The index holds folded text, so snippets are cut from the stored columns instead of FTS5 snippet().
+    """
+    where = "fatawa_fts MATCH ?"
+    params: list = [match]
+    if topic:
+        where += " AND f.topic = ?"
+        params.append(topic)
+    if canonical_only:
+        where += " AND f.canonical_url IS NULL"
+    rows = conn.execute(
+        f"""
+        SELECT f.id, f.url, f.title, f.question_summary, f.topic, f.draft_fatwa_text
+        FROM fatawa_fts
+        JOIN fatawa f ON f.id = fatawa_fts.rowid
+        WHERE {where}
+        ORDER BY bm25(fatawa_fts, 10.0, 4.0, 1.0)
+        LIMIT ? OFFSET ?
+        """,
+        [*params, limit, offset],
+    ).fetchall()
+    items = [dict(r) for r in rows]
+    for item in items:
+        text = item.pop("draft_fatwa_text")
+        item["snippet"] = highlight_snippet([item["title"], item["question_summary"], text], terms)
+    total = cached_count(
+        conn,
+        ("fts", topic, canonical_only, match),
+        total_mode,
+        f"SELECT COUNT(*) FROM fatawa_fts JOIN fatawa f ON f.id = fatawa_fts.rowid WHERE {where}",
+        params,
+    )
+    return {"total": total, "items": items, "next_after_id": None}
+
+
 @app.get("/api/fatawa")
 def list_fatawa(
+    request: Request,
     topic: Optional[str] = None,
     q: Optional[str] = None,
     limit: int = Query(30, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    after_id: Optional[int] = Query(None, ge=1),
+    total: str = Query("exact", pattern="^(exact|approx|none)$"),
+    canonical_only: bool = False,
+) -> Response:
+    """Newest-first listing. Page with `after_id=<next_after_id>` rather than `offset`.
+
+    `total` is exact (cached per DB generation), approx (may be a few minutes
+    stale) or none. Search results are bm25-ordered and page with `offset` only.
+    `canonical_only` hides near-duplicates of another fatwa.
+    """
+    return cached_json(
+        request,
+        ("fatawa", topic, q, canonical_only, limit, offset, after_id, total),
+        lambda conn: query_fatawa(conn, topic, q, canonical_only, limit, offset, after_id, total),
+    )
+
+
+def query_fatawa(
+    conn: sqlite3.Connection,
+    topic: Optional[str],
+    q: Optional[str],
+    canonical_only: bool,
+    limit: int,
+    offset: int,
+    after_id: Optional[int],
+    total: str,
 ) -> dict:
-    conn = get_conn()
+    # Without the column nothing has been deduplicated, so every row is canonical.
+    canonical_only = canonical_only and has_column(conn, "fatawa", "canonical_url")
+    if q and has_search_index(conn):
+        if after_id is not None:
+            raise HTTPException(status_code=400, detail="after_id cannot be combined with q; use offset")
+        match = match_query(q)
+        if match is None:
+            return {"total": 0, "items": [], "next_after_id": None}
+        return search_fatawa(conn, match, query_terms(q), topic, canonical_only, limit, offset, total)
+
+    # Substring scan; only used on databases built before fatawa_fts existed.
     where = []
     params = []
     if topic:
@@ -76,8 +730,19 @@ def list_fatawa(
         where.append("(title LIKE ? OR question_summary LIKE ? OR draft_fatwa_text LIKE ?)")
         needle = f"%{q}%"
         params.extend([needle, needle, needle])
+    if canonical_only:
+        where.append("canonical_url IS NULL")
 
     where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    count = cached_count(
+        conn, ("list", topic, q, canonical_only), total, f"SELECT COUNT(*) FROM fatawa {where_sql}", params
+    )
+
+    # Keyset page: with idx_fatawa_topic_id this is an index range scan at any depth.
+    if after_id is not None:
+        where.append("id < ?")
+        params.append(after_id)
+        where_sql = f"WHERE {' AND '.join(where)}"
     rows = conn.execute(
         f"""
         SELECT id, url, title, question_summary, topic
@@ -88,20 +753,176 @@ def list_fatawa(
         """,
         [*params, limit, offset],
     ).fetchall()
-    total = conn.execute(
-        f"SELECT COUNT(*) AS n FROM fatawa {where_sql}",
-        params,
-    ).fetchone()["n"]
-    conn.close()
-    return {"total": total, "items": [dict(r) for r in rows]}
+    next_after_id = rows[-1]["id"] if len(rows) == limit else None
+    return {"total": count, "items": [dict(r) for r in rows], "next_after_id": next_after_id}
+
+
+@app.get("/api/verses/surahs")
+def verse_surahs(request: Request) -> Response:
+    """Per-surah counts of citing fatawa and of citations."""
+    return cached_json(request, ("verse_surahs",), surah_counts_payload)
+
+
+def surah_counts_payload(conn: sqlite3.Connection) -> dict:
+    require_verse_index(conn)
+    rows = conn.execute(
+        """
+        SELECT surah, COUNT(DISTINCT fatwa_id) AS fatawa, COUNT(*) AS citations
+        FROM fatwa_verses
+        GROUP BY surah
+        ORDER BY surah
+        """
+    ).fetchall()
+    return {"surahs": [dict(r) for r in rows]}
+
+
+@app.get("/api/verses/{ref}/fatawa")
+def fatawa_citing_verse(
+    request: Request,
+    ref: str,
+    limit: int = Query(30, ge=1, le=200),
+    after_id: Optional[int] = Query(None, ge=1),
+) -> Response:
+    """Fatawa citing any verse in `ref` ("2:275" or "2:275-279"), newest first, keyset-paged."""
+    parsed = parse_verse_ref(ref)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail="ref must look like 2:275 or 2:275-279")
+    return cached_json(
+        request,
+        ("verse_fatawa", parsed, limit, after_id),
+        lambda conn: verse_fatawa_payload(conn, parsed, limit, after_id),
+    )
+
+
+def require_verse_index(conn: sqlite3.Connection) -> None:
+    if not has_table(conn, "fatwa_verses"):
+        raise HTTPException(status_code=503, detail="verse index missing; rerun build_sqlite_db.py")
+
+
+def verse_fatawa_payload(
+    conn: sqlite3.Connection, verse: tuple[int, int, int], limit: int, after_id: Optional[int]
+) -> dict:
+    require_verse_index(conn)
+    surah, start, end = verse
+    # Overlap test on idx_fatwa_verses_verse: a range scan over one surah's citations.
+    params: list = [surah, end, start]
+    after_sql = ""
+    if after_id is not None:
+        after_sql = "AND f.id < ?"
+        params.append(after_id)
+    rows = conn.execute(
+        f"""
+        SELECT f.id, f.url, f.title, f.question_summary, f.topic
+        FROM fatawa f
+        WHERE f.id IN (
+            SELECT fatwa_id FROM fatwa_verses
+            WHERE surah = ? AND ayah_start <= ? AND ayah_end >= ?
+        ) {after_sql}
+        ORDER BY f.id DESC
+        LIMIT ?
+        """,
+        [*params, limit],
+    ).fetchall()
+    next_after_id = rows[-1]["id"] if len(rows) == limit else None
+    return {
+        "verse": {"surah": surah, "ayah_start": start, "ayah_end": end},
+        "items": [dict(r) for r in rows],
+        "next_after_id": next_after_id,
+    }
+
+
+def export_compressor(compress: str) -> Any:
+    """Object with compress()/flush() for the chosen encoding, or None."""
+    if compress == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compress == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return None
+
+
+def iter_export(topic: Optional[str], since: Optional[int], compress: str) -> Iterator[bytes]:
+    """Yield NDJSON chunks straight off one read snapshot; memory is bounded by EXPORT_CHUNK_ROWS."""
+    compressor = export_compressor(compress)
+    conn = READ_POOL.open()
+    try:
+        have = {row[1] for row in conn.execute("PRAGMA table_info(fatawa)")}
+        columns = [c for c in EXPORT_COLUMNS if c in have]
+        changed_at = "updated_at_unix" if "updated_at_unix" in have else "generated_at_unix"
+        where = []
+        params: list = []
+        if topic:
+            where.append("topic = ?")
+            params.append(topic)
+        if since is not None:
+            where.append(f"{changed_at} >= ?")
+            params.append(since)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        cur = conn.execute(
+            f"""
+            SELECT {', '.join(columns)}
+            FROM fatawa
+            {where_sql}
+            ORDER BY {changed_at}, id
+            """,
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            chunk = "".join(json.dumps(dict(r), ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        conn.close()
+
+
+@app.get("/api/export")
+def export_fatawa(
+    topic: Optional[str] = None,
+    since: Optional[int] = Query(None, description="Only rows with updated_at_unix >= since"),
+    compress: str = Query("none", pattern="^(none|gzip|zstd)$"),
+) -> StreamingResponse:
+    """Stream every matching fatwa as NDJSON, least recently updated first.
+
+    updated_at_unix is set by the builder whenever a sync changes a row,
+    including canonical_url and topic_confidence updates. For incremental
+    pulls pass the largest updated_at_unix already seen as `since`; rows at
+    that exact second are sent again, so dedupe on `url`.
+    """
+    if not DB_PATH.exists():
+        raise HTTPException(status_code=500, detail=f"DB not found: {DB_PATH}")
+    headers = {"Content-Disposition": 'attachment; filename="fatawa.ndjson"'}
+    if compress != "none":
+        headers["Content-Encoding"] = compress
+    return StreamingResponse(
+        iter_export(topic, since, compress), media_type="application/x-ndjson", headers=headers
+    )
 
 
 @app.get("/api/fatawa/{fatwa_id}")
-def get_fatwa(fatwa_id: int) -> dict:
-    conn = get_conn()
+def get_fatwa(request: Request, fatwa_id: int) -> Response:
+    return cached_json(
+        request,
+        ("fatwa", fatwa_id),
+        lambda conn: fatwa_payload(conn, fatwa_id),
+        lambda conn: latest_feedback_id(conn, fatwa_id),
+    )
+
+
+def latest_feedback_id(conn: sqlite3.Connection, fatwa_id: int) -> Optional[int]:
+    """Newest feedback id for one fatwa (an idx_feedback_fatwa_id lookup); changes with every comment."""
+    return conn.execute("SELECT MAX(id) FROM feedback WHERE fatwa_id = ?", (fatwa_id,)).fetchone()[0]
+
+
+def fatwa_payload(conn: sqlite3.Connection, fatwa_id: int) -> dict:
     row = conn.execute("SELECT * FROM fatawa WHERE id = ?", (fatwa_id,)).fetchone()
     if not row:
-        conn.close()
         raise HTTPException(status_code=404, detail="fatwa not found")
     feedback = conn.execute(
         """
@@ -113,26 +934,44 @@ def get_fatwa(fatwa_id: int) -> dict:
         """,
         (fatwa_id,),
     ).fetchall()
-    conn.close()
     payload = dict(row)
     payload["feedback"] = [dict(x) for x in feedback]
     return payload
 
 
+@app.get("/api/fatawa/{fatwa_id}/related")
+def related_fatawa(request: Request, fatwa_id: int, limit: int = Query(10, ge=1, le=50)) -> Response:
+    """Most similar fatawa by title/question TF-IDF, precomputed by the build into fatwa_neighbors."""
+    return cached_json(
+        request, ("related", fatwa_id, limit), lambda conn: related_payload(conn, fatwa_id, limit)
+    )
+
+
+def related_payload(conn: sqlite3.Connection, fatwa_id: int, limit: int) -> dict:
+    if not has_table(conn, "fatwa_neighbors"):
+        raise HTTPException(status_code=503, detail="related index missing; rerun build_sqlite_db.py")
+    if not conn.execute("SELECT 1 FROM fatawa WHERE id = ?", (fatwa_id,)).fetchone():
+        raise HTTPException(status_code=404, detail="fatwa not found")
+    # A primary-key range scan of fatwa_neighbors plus one fatawa lookup per neighbour.
+    rows = conn.execute(
+        """
+        SELECT f.id, f.url, f.title, f.question_summary, f.topic, n.score
+        FROM fatwa_neighbors n
+        JOIN fatawa f ON f.id = n.neighbor_id
+        WHERE n.fatwa_id = ?
+        ORDER BY n.rank
+        LIMIT ?
+        """,
+        (fatwa_id, limit),
+    ).fetchall()
+    return {"fatwa_id": fatwa_id, "items": [dict(r) for r in rows]}
+
+
 @app.post("/api/feedback")
-def add_feedback(data: FeedbackIn) -> dict:
+async def add_feedback(data: FeedbackIn) -> dict:
     comment = (data.comment or "").strip()
     if not comment:
         raise HTTPException(status_code=400, detail="comment is required")
-    conn = get_conn()
-    exists = conn.execute("SELECT id FROM fatawa WHERE id = ?", (data.fatwa_id,)).fetchone()
-    if not exists:
-        conn.close()
+    if not await FEEDBACK.submit(data.fatwa_id, comment, FEEDBACK_ENQUEUE_TIMEOUT):
         raise HTTPException(status_code=404, detail="fatwa not found")
-    with conn:
-        conn.execute(
-            "INSERT INTO feedback (fatwa_id, comment, created_at_unix) VALUES (?, ?, ?)",
-            (data.fatwa_id, comment, int(time.time())),
-        )
-    conn.close()
     return {"ok": True}
@@ -0,0 +1,209 @@
+"""Prometheus text-format counters, histograms and callback gauges, without a client library."""
+
+from __future__ import annotations
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable, Union
+
+# Seconds; spans sub-millisecond SQLite lookups up to slow exports.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_INF_LABEL = 'le="+Inf"'
+
+LabelValues = tuple[str, ...]
+CallbackValue = Union[float, Iterable[tuple[LabelValues, float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            i = bisect_left(self.buckets, value)
+            if i < len(self.counts):
+                self.counts[i] += 1
+
+
+class _Family(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...]) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]: ...
+
+
+class _LabelledFamily(_Family):
+    """A family whose samples are children created per label values and updated in place."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...]) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._children: dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> object: ...
+
+    def labels(self, *values: str):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+
+class Counter(_LabelledFamily):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class Histogram(_LabelledFamily):
+    """Fixed-bucket histogram; buckets are stored non-cumulatively and summed on render."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labelnames: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labelnames, values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, _INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {count}")
+        return lines
+
+
+class CallbackMetric(_Family):
+    """A gauge whose value(s) are read from `fn` at scrape time.
+
+    `fn` returns a number, or (label values, number) pairs for a labelled family.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, help_text: str, labelnames: tuple[str, ...], fn: Callable[[], CallbackValue]
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        value = self.fn()
+        samples = [((), value)] if isinstance(value, (int, float)) else value
+        for values, number in samples:
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(number)}")
+        return lines
+
+
+class Registry:
+    """Named metric families rendered together in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._families: dict[str, _Family] = {}
+
+    def _add(self, family: _Family) -> _Family:
+        if family.name in self._families:
+            raise ValueError(f"duplicate metric {family.name}")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(
+        self, name: str, help_text: str, fn: Callable[[], CallbackValue], labelnames: tuple[str, ...] = ()
+    ) -> CallbackMetric:
+        return self._add(CallbackMetric(name, help_text, labelnames, fn))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,13 @@
+"""Offline benchmarks for extraction, draft generation, DB build and API latency."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = ROOT / "scripts"
+
+# The pipeline scripts import their siblings as top-level modules.
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare a benchmark results JSON against a stored baseline and flag regressions."""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+from bench.run import RESULTS_DIR
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """Return (report lines, regressed metric names).
+
+    A metric regresses when it moved more than `threshold` (a fraction) in
+    its worse direction: down for "higher" metrics, up for "lower" ones.
+    """
+    lines, regressions = [], []
+    base_metrics, cur_metrics = baseline["metrics"], current["metrics"]
+    for name in sorted(set(base_metrics) | set(cur_metrics)):
+        if name not in cur_metrics:
+            lines.append(f"{name} baseline={base_metrics[name]['value']} current=missing")
+            continue
+        if name not in base_metrics:
+            lines.append(f"{name} baseline=missing current={cur_metrics[name]['value']} status=new")
+            continue
+        base, cur = base_metrics[name]["value"], cur_metrics[name]["value"]
+        change = (cur - base) / base if base else 0.0
+        worse = -change if cur_metrics[name]["better"] == "higher" else change
+        status = "regressed" if worse > threshold else "improved" if worse < -threshold else "ok"
+        if status == "regressed":
+            regressions.append(name)
+        lines.append(
+            f"{name} baseline={base} current={cur} change={change * 100:+.1f}% unit={cur_metrics[name]['unit']} "
+            f"status={status}"
+        )
+    return lines, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flag benchmark regressions against a stored baseline")
+    parser.add_argument("--current", default="", help="Results JSON (default: bench/results/latest_<size>.json)")
+    parser.add_argument("--baseline", default="", help="Baseline JSON (default: bench/results/baseline_<size>.json)")
+    parser.add_argument("--size", default="10k", help="Corpus size used to pick the default files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Tolerated change before flagging (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    current_path = Path(args.current) if args.current else RESULTS_DIR / f"latest_{args.size}.json"
+    baseline_path = Path(args.baseline) if args.baseline else RESULTS_DIR / f"baseline_{args.size}.json"
+    current = json.loads(current_path.read_text(encoding="utf-8"))
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+
+    for key in ("size", "seed", "platform", "python"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning meta {key} differs: baseline={baseline['meta'].get(key)} current={current['meta'].get(key)}")
+    lines, regressions = compare(baseline, current, args.threshold)
+    for line in lines:
+        print(line)
+    print(
+        f"done metrics={len(lines)} regressions={len(regressions)} threshold={args.threshold} "
+        f"baseline={baseline_path} current={current_path}"
+    )
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic corpus of islamqa.org-shaped entries in mixed English and Arabic."""
+
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import random
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterator
+
+from bench import ROOT
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SEED = 20260101
+DATA_DIR = ROOT / "bench" / ".data"
+
+MADHHABS = ["hanafi", "shafii", "maliki", "hanbali", "general"]
+SOURCES = ["daruliftaa", "askimam", "hadithanswers", "muftionline", "seekersguidance", "islamqa-org"]
+BASE_TIME = 1767225600
+_SENTENCE_END_RE = re.compile(r"(?<=[.?؟]) ")
+
+# (English subject, Arabic subject) pairs; the English side carries the
+# generator's topic keywords so every topic rule is exercised.
+SUBJECTS = [
+    ("interest on a bank loan", "الفَائِدَة على قرض البنك"),
+    ("a mortgage with a fixed APR", "الرَّهن العقاري بفائدة ثابتة"),
+    ("paying a credit card balance late", "بطاقة الائتمان والربا"),
+    ("cooking with wine", "الطبخ بالخمر"),
+    ("working in a shop that sells beer and alcohol", "العمل في متجر يبيع الخَمْر"),
+    ("buying a lottery ticket", "شراء تذكرة اليانصيب"),
+    ("a friendly bet on a football match", "المراهنة على مباراة كرة القدم"),
+    ("gelatin in sweets", "الجيلاتين في الحلويات"),
+    ("zabiha slaughter of chicken", "الذبح الشرعي للدجاج"),
+    ("an ingredient derived from pork", "مكوّن مشتق من الخنزير"),
+    ("marriage without a guardian", "النكاح بغير وليّ"),
+    ("divorce pronounced in anger", "الطَّلَاق في حال الغضب"),
+    ("a wife working outside the home", "عمل الزوجة خارج البيت"),
+    ("combining prayer while travelling", "الجمع بين الصلاتين في السفر"),
+    ("wudu with nail polish", "الوضوء مع طلاء الأظافر"),
+    ("zakat on retirement savings", "زكاة مدخرات التقاعد"),
+    ("fasting in Ramadan during exams", "صيام رمضان أثناء الامتحانات"),
+    ("insulin injections while fasting", "حقن الأنسولين أثناء الصيام"),
+    ("medicine in gelatin capsules", "الدواء في كبسولات الجيلاتين"),
+    ("surgery that requires a blood transfusion", "الجراحة ونقل الدم"),
+    ("praying behind an imam of another sect", "الصلاة خلف إمام من مذهب آخر"),
+    ("takfir of other Muslims", "تكفير المسلمين"),
+    ("the Mutazili view of free will", "رأي المعتزلة في حرية الإرادة"),
+    ("using AI to write Friday sermons", "استخدام الذكاء الاصطناعي لكتابة خطبة الجمعة"),
+    ("sharing a deepfake video", "نشر مقطع مزيف"),
+    ("selling clothes online", "بيع الملابس عبر الإنترنت"),
+    ("visiting graves on Eid", "زيارة القبور في العيد"),
+    ("reciting Quran without wudu", "قراءة القرآن بغير وضوء"),
+]
+
+EN_QUESTION_TEMPLATES = [
+    "What is the ruling on {s}?",
+    "Is {s} permissible in Islam?",
+    "My family disagrees about {s}. What should I do?",
+    "I have been told that {s} is forbidden. Is this correct, and what is the evidence?",
+    "Assalamu alaikum. Could you clarify the ruling on {s} for someone living in the West?",
+]
+EN_CONTEXT = [
+    "I live in {city} and there is no local scholar I can ask.",
+    "This situation has become common among my colleagues.",
+    "Some say it is a matter of necessity in our circumstances.",
+    "My parents insist on it and I do not want to upset them.",
+    "I was forced into this arrangement by my employer.",
+    "I would appreciate a detailed reply with references.",
+]
+EN_ANSWER = [
+    "In the Name of Allah, the Most Gracious, the Most Merciful.",
+    "The scholars have discussed {s} at length, and the principle is that harm is to be removed.",
+    "The Quran commands justice and forbids exploitation, and {s} must be weighed against these aims.",
+    "If there is genuine necessity or duress, the ruling may be relaxed to the extent of the need.",
+    "One should avoid doubtful matters where a permissible alternative is readily available.",
+    "The jurists of the {m} school mention conditions that must be met before this is allowed.",
+    "Intention matters, but a good intention does not make an impermissible act permissible.",
+    "It is advisable to consult a local scholar who knows the details of your situation.",
+    "And Allah knows best.",
+]
+AR_QUESTION_TEMPLATES = [
+    "ما حكم {s}؟",
+    "هل يجوز {s} شرعًا؟",
+    "سُئِلَ عن {s}، فما الحكم في ذلك؟",
+]
+AR_CONTEXT = [
+    "أعيش في بلد غير مسلم ولا يوجد عالم قريب.",
+    "انتشر هذا الأمر بين الناس في زماننا.",
+    "أرجو الإجابة مع ذكر الأدلة.",
+]
+AR_ANSWER = [
+    "الحمد لله رب العالمين، والصلاة والسلام على رسول الله.",
+    "الأصل في المعاملات الإباحة ما لم يَرِد دليلٌ على التحريم.",
+    "قال الله تعالى: وَأَحَلَّ اللَّهُ الْبَيْعَ وَحَرَّمَ الرِّبَا.",
+    "والضرورات تبيح المحظورات، والضرورة تُقدَّر بقدرها.",
+    "وينبغي للمسلم أن يتقي الشبهات استبراءً لدينه وعرضه.",
+    "والله أعلم بالصواب.",
+]
+CITIES = ["London", "Toronto", "Chicago", "Berlin", "Sydney", "Johannesburg", "Karachi", "Kuala Lumpur"]
+
+
+def _paragraphs(rng: random.Random, pool: list[str], count: int, **fmt: str) -> list[str]:
+    out = []
+    for _ in range(count):
+        sentences = rng.choices(pool, k=rng.randint(2, 6))
+        out.append(" ".join(s.format(**fmt) for s in sentences))
+    return out
+
+
+def make_entry(i: int, rng: random.Random, recent: deque) -> dict:
+    """Entry `i`; about 5% republish a recent question under another madhhab/source path."""
+    madhhab = MADHHABS[rng.randrange(len(MADHHABS))]
+    source = SOURCES[rng.randrange(len(SOURCES))]
+    lang = rng.choices(["en", "ar", "mixed"], weights=[60, 25, 15])[0]
+    if recent and rng.random() < 0.05:
+        title, question, answer, lang = recent[rng.randrange(len(recent))]
+    else:
+        en_subject, ar_subject = SUBJECTS[rng.randrange(len(SUBJECTS))]
+        if lang == "ar":
+            title = f"حكم {ar_subject}"
+            question = " ".join(
+                [rng.choice(AR_QUESTION_TEMPLATES).format(s=ar_subject)] + rng.sample(AR_CONTEXT, rng.randint(0, 2))
+            )
+            answer = _paragraphs(rng, AR_ANSWER, rng.randint(1, 5))
+        else:
+            title = f"Ruling on {en_subject}"
+            context = [c.format(city=rng.choice(CITIES)) for c in rng.sample(EN_CONTEXT, rng.randint(0, 3))]
+            question = " ".join([rng.choice(EN_QUESTION_TEMPLATES).format(s=en_subject)] + context)
+            answer = _paragraphs(rng, EN_ANSWER, rng.randint(1, 6), s=en_subject, m=madhhab.capitalize())
+            if lang == "mixed":
+                answer.insert(1, rng.choice(AR_ANSWER[1:5]))
+                answer.append(AR_ANSWER[-1])
+        recent.append((title, question, answer, lang))
+    q_label, a_label = ("السؤال:", "الجواب:") if lang == "ar" else ("Question:", "Answer:")
+    raw_text = " ".join([q_label, question, a_label, *answer])
+    return {
+        "url": f"https://islamqa.org/{madhhab}/{source}/{i}/question-{i}/",
+        "id": i,
+        "madhhab": madhhab,
+        "source": source,
+        "title": title,
+        "question": question,
+        "source_answer": " ".join(answer),
+        "raw_text": raw_text,
+        "scraped_at_unix": BASE_TIME + i * 37,
+    }
+
+
+def iter_entries(n: int, seed: int = DEFAULT_SEED) -> Iterator[dict]:
+    """Yield `n` entries; the same (n, seed) always yields the same corpus."""
+    rng = random.Random(seed)
+    recent: deque = deque(maxlen=200)
+    for i in range(1, n + 1):
+        yield make_entry(i, rng, recent)
+
+
+def render_html(entry: dict) -> str:
+    """A WordPress-style post page from which both extractors recover `entry`'s title and raw_text."""
+    ar = entry["raw_text"].startswith("السؤال")
+    q_label, a_label = ("السؤال:", "الجواب:") if ar else ("Question:", "Answer:")
+    # Split on single spaces after sentence ends so the text nodes rejoin to the same raw_text.
+    sentences = _SENTENCE_END_RE.split(entry["source_answer"])
+    answer = [" ".join(sentences[k : k + 3]) for k in range(0, len(sentences), 3)]
+    body = "".join(f"<p>{html.escape(p)}</p>" for p in answer[1:])
+    e = html.escape
+    return (
+        f"<!DOCTYPE html><html lang=\"{'ar' if ar else 'en'}\" dir=\"{'rtl' if ar else 'ltr'}\"><head>"
+        f"<meta charset=\"utf-8\"><title>{e(entry['title'])} - IslamQA</title>"
+        "<script>window.dataLayer = window.dataLayer || [];</script>"
+        "<style>.entry-content p { margin: 0 0 1em; }</style></head><body>"
+        "<header><nav><a href=\"/\">Home</a> <a href=\"/category/\">Categories</a></nav></header>"
+        f"<article id=\"post-{entry['id']}\"><h1 class=\"entry-title\">{e(entry['title'])}</h1>"
+        f"<div class=\"entry-meta\">Answered by {e(entry['source'])}</div>"
+        "<div class=\"entry-content\">"
+        f"<p><strong>{q_label}</strong> {e(entry['question'])}</p>"
+        f"<p><strong>{a_label}</strong> {e(answer[0])}</p>{body}"
+        "<script>if (window.ads) { ads.push({}); }</script><!-- .entry-content -->"
+        "</div></article><footer><p>&copy; IslamQA</p></footer></body></html>"
+    )
+
+
+def corpus_path(size: str, seed: int = DEFAULT_SEED, data_dir: Path = DATA_DIR) -> Path:
+    return data_dir / f"corpus_{size}_{seed}.jsonl"
+
+
+def ensure_corpus(size: str, seed: int = DEFAULT_SEED, data_dir: Path = DATA_DIR) -> Path:
+    """Write the corpus JSONL once; later runs reuse the file for the same size and seed."""
+    path = corpus_path(size, seed, data_dir)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in iter_entries(SIZES[size], seed):
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    tmp.replace(path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic scraped corpus")
+    parser.add_argument("--size", choices=sorted(SIZES), default="10k", help="Number of entries")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Corpus seed")
+    parser.add_argument("--output", default="", help="Output JSONL (default: bench/.data/corpus_<size>_<seed>.jsonl)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("w", encoding="utf-8") as f:
+            for entry in iter_entries(SIZES[args.size], args.seed):
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    else:
+        output = ensure_corpus(args.size, args.seed)
+    print(f"done entries={SIZES[args.size]} seed={args.seed} seconds={time.perf_counter() - started:.2f} output={output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Check every HTML extractor against the saved fixtures' expected output and against each other."""
+
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Optional
+
+from bench import ROOT
+from bench.corpus import DEFAULT_SEED, iter_entries, render_html
+from scrape_islamqa_org import EXTRACTORS, parse_post
+
+FIXTURES_DIR = ROOT / "bench" / "fixtures"
+EXPECTED_PATH = FIXTURES_DIR / "expected.json"
+FIXTURE_URL = "https://islamqa.org/hanafi/daruliftaa/1/fixture/"
+FIELDS = ("title", "question", "source_answer", "raw_text")
+
+
+def extract_fields(html: str, extractor: str) -> Optional[dict]:
+    item = parse_post(FIXTURE_URL, html, extractor, 0)
+    return {k: getattr(item, k) for k in FIELDS} if item is not None else None
+
+
+def load_fixtures() -> dict[str, str]:
+    return {p.name: p.read_text(encoding="utf-8") for p in sorted(FIXTURES_DIR.glob("*.html"))}
+
+
+def check_fixtures(extractors: list[str]) -> list[str]:
+    expected = json.loads(EXPECTED_PATH.read_text(encoding="utf-8"))
+    problems = []
+    for name, html in load_fixtures().items():
+        if name not in expected:
+            problems.append(f"fixture={name} missing from {EXPECTED_PATH.name}; run with --update")
+            continue
+        for extractor in extractors:
+            got = extract_fields(html, extractor)
+            if got != expected[name]:
+                problems.append(f"fixture={name} extractor={extractor} differs from expected output")
+    return problems
+
+
+def check_synthetic(extractors: list[str], pages: int, seed: int) -> list[str]:
+    """Synthetic pages must round-trip to the corpus entry exactly, under every extractor."""
+    problems = []
+    for entry in iter_entries(pages, seed):
+        html = render_html(entry)
+        for extractor in extractors:
+            item = parse_post(entry["url"], html, extractor, entry["scraped_at_unix"])
+            if item is None or item.__dict__ != entry:
+                problems.append(f"synthetic id={entry['id']} extractor={extractor} does not round-trip")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTML extractor parity check over saved fixtures")
+    parser.add_argument("--synthetic-pages", type=int, default=500, help="Synthetic pages to round-trip")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Corpus seed for synthetic pages")
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Rewrite expected.json from the bs4 extractor (review the diff before committing)",
+    )
+    args = parser.parse_args()
+
+    extractors = sorted(EXTRACTORS)
+    if args.update:
+        expected = {name: extract_fields(html, "bs4") for name, html in load_fixtures().items()}
+        EXPECTED_PATH.write_text(json.dumps(expected, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"updated fixtures={len(expected)} output={EXPECTED_PATH}")
+    problems = check_fixtures(extractors) + check_synthetic(extractors, args.synthetic_pages, args.seed)
+    for problem in problems:
+        print(problem)
+    print(
+        f"done fixtures={len(load_fixtures())} synthetic_pages={args.synthetic_pages} "
+        f"extractors={','.join(extractors)} problems={len(problems)}"
+    )
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
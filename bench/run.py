@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Run the offline benchmarks on a synthetic corpus and write the metrics as JSON."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator
+
+from bench import ROOT, SCRIPTS_DIR
+from bench.corpus import DATA_DIR, DEFAULT_SEED, SIZES, ensure_corpus, render_html
+from bench.parity import load_fixtures
+from generate_mutazili_fatawa import classifier_features, draft_lines, model_fingerprints, train_classifier
+from scrape_islamqa_org import EXTRACTORS, parse_post
+
+RESULTS_DIR = ROOT / "bench" / "results"
+
+
+def metric(value: float, unit: str, better: str) -> dict:
+    return {"value": round(value, 4), "unit": unit, "better": better}
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    """Fastest wall time of `repeat` runs of `fn`, which is less noisy than the mean."""
+    times = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Context:
+    """Paths shared by the benchmarks; later stages reuse earlier stages' outputs."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.size = args.size
+        self.entries = SIZES[args.size]
+        self.work_dir = Path(args.work_dir)
+        self.corpus = ensure_corpus(args.size, args.seed, self.work_dir)
+        self.drafts = self.work_dir / f"drafts_{args.size}_{args.seed}.jsonl"
+        self.db = self.work_dir / f"bench_{args.size}_{args.seed}.sqlite3"
+
+    def iter_lines(self) -> Iterator[bytes]:
+        with self.corpus.open("rb") as f:
+            yield from f
+
+    def ensure_drafts(self) -> None:
+        if not self.drafts.exists():
+            write_drafts(self.iter_lines(), self.drafts)
+
+    def ensure_db(self) -> None:
+        if not self.db.exists():
+            self.ensure_drafts()
+            run_build(self)
+
+
+def write_drafts(lines: Iterator[bytes], path: Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as out:
+        for line in lines:
+            out.write(draft_lines([line])[0][0])
+    tmp.replace(path)
+
+
+def bench_extract(ctx: Context) -> dict[str, dict]:
+    """Title/body extraction plus question/answer split, per backend, on synthetic pages and fixtures."""
+    pages = [(e["url"], render_html(e)) for e in map(json.loads, islice(ctx.iter_lines(), ctx.args.extract_pages))]
+    pages += [("https://islamqa.org/hanafi/daruliftaa/1/fixture/", html) for html in load_fixtures().values()]
+    results = {}
+    for extractor in sorted(EXTRACTORS):
+        seconds = best_of(ctx.args.repeat, lambda: [parse_post(url, html, extractor, 0) for url, html in pages])
+        results[f"extract.{extractor}.pages_per_sec"] = metric(len(pages) / seconds, "pages/s", "higher")
+    return results
+
+
+def bench_generate(ctx: Context) -> dict[str, dict]:
+    """Per-line draft generation (JSON decode, topic scan, draft build, JSON encode) over the corpus."""
+    lines = list(ctx.iter_lines())
+    seconds = best_of(ctx.args.repeat, lambda: [draft_lines([line]) for line in lines])
+    write_drafts(iter(lines), ctx.drafts)
+    return {"generate.entries_per_sec": metric(len(lines) / seconds, "entries/s", "higher")}
+
+
+def bench_classify(ctx: Context) -> dict[str, dict]:
+    """Batch topic model: fit on the corpus, then featurize + predict it in 2048-entry batches."""
+    entries = [json.loads(line) for line in ctx.iter_lines()]
+    fit_seconds = best_of(ctx.args.repeat, lambda: train_classifier(iter(entries), {}, 5.0))
+    model = train_classifier(iter(entries), {}, 5.0)[0]
+    batches = [entries[i : i + 2048] for i in range(0, len(entries), 2048)]
+    seconds = best_of(
+        ctx.args.repeat, lambda: [model.predict([classifier_features(e) for e in batch]) for batch in batches]
+    )
+    classifier = (model, model_fingerprints(""))
+    lines = list(ctx.iter_lines())
+    line_batches = [lines[i : i + 2048] for i in range(0, len(lines), 2048)]
+    draft_seconds = best_of(ctx.args.repeat, lambda: [draft_lines(b, classifier=classifier) for b in line_batches])
+    return {
+        "classify.fit_seconds": metric(fit_seconds, "s", "lower"),
+        "classify.entries_per_sec": metric(len(entries) / seconds, "entries/s", "higher"),
+        "generate.model_entries_per_sec": metric(len(entries) / draft_seconds, "entries/s", "higher"),
+    }
+
+
+def run_build(ctx: Context) -> float:
+    """Run build_sqlite_db.py on the corpus and drafts; returns the build's own reported seconds."""
+    proc = subprocess.run(
+        [
+            sys.executable,
+            str(SCRIPTS_DIR / "build_sqlite_db.py"),
+            "--scraped",
+            str(ctx.corpus),
+            "--drafts",
+            str(ctx.drafts),
+            "--db",
+            str(ctx.db),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    # Only the final "done" summary; the timing= lines before it also carry seconds=.
+    m = re.search(r"^done .*\bseconds=([\d.]+)", proc.stdout, re.M)
+    if not m:
+        raise RuntimeError(f"unexpected build output: {proc.stdout[-500:]}")
+    return float(m.group(1))
+
+
+def bench_build(ctx: Context) -> dict[str, dict]:
+    """A fresh build, then a no-change resync of the same inputs."""
+    ctx.ensure_drafts()
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{ctx.db}{suffix}").unlink(missing_ok=True)
+    fresh = run_build(ctx)
+    resync = run_build(ctx)
+    return {
+        "build.fresh.rows_per_sec": metric(ctx.entries / fresh, "rows/s", "higher"),
+        "build.resync.rows_per_sec": metric(ctx.entries / resync, "rows/s", "higher"),
+    }
+
+
+def api_cases(ctx: Context, client) -> dict[str, list[str]]:
+    """Request URLs per case; each case cycles through its variants so no single row dominates."""
+    topics = [t["topic"] for t in client.get("/api/topics").json()["topics"]] or [""]
+    n = ctx.entries
+    ids = [1 + (n * k) // 10 for k in range(10)]
+    return {
+        "topics": ["/api/topics"],
+        "list_first_page": ["/api/fatawa?limit=20&total=none"],
+        "list_topic_exact_total": [f"/api/fatawa?topic={t}&limit=20&total=exact" for t in topics],
+        "list_deep_offset": [f"/api/fatawa?limit=20&offset={n // 2 + k}&total=none" for k in range(10)],
+        "list_keyset": [f"/api/fatawa?limit=20&after_id={i}&total=none" for i in ids],
+        "search_en": [f"/api/fatawa?q={q}&limit=20&total=none" for q in ("mortgage", "gelatin", "divorce anger")],
+        "search_ar": [f"/api/fatawa?q={q}&limit=20&total=none" for q in ("الربا", "الصيام", "الخمر")],
+        "detail": [f"/api/fatawa/{i}" for i in ids],
+        "related": [f"/api/fatawa/{i}/related" for i in ids],
+        "verse": ["/api/verses/2:275/fatawa?limit=20", "/api/verses/5:90/fatawa?limit=20"],
+    }
+
+
+def bench_api(ctx: Context) -> dict[str, dict]:
+    """In-process (ASGI) request latency per endpoint, with the response and count caches cleared per request."""
+    ctx.ensure_db()
+    os.environ["QURANQA_DB_PATH"] = str(ctx.db)
+    sys.path.insert(0, str(ROOT))
+    from fastapi.testclient import TestClient
+
+    from app import main as api
+
+    if api.DB_PATH != ctx.db:
+        raise RuntimeError("app.main was imported before QURANQA_DB_PATH was set")
+    results = {}
+    with TestClient(api.app) as client:
+        for name, urls in api_cases(ctx, client).items():
+            samples = []
+            for k in range(ctx.args.api_requests):
+                api.RESPONSE_CACHE = api.ResponseCache(api.RESPONSE_CACHE_SIZE, api.RESPONSE_CACHE_TTL)
+                api._count_cache.clear()
+                started = time.perf_counter()
+                res = client.get(urls[k % len(urls)])
+                samples.append((time.perf_counter() - started) * 1000)
+                if res.status_code != 200:
+                    raise RuntimeError(f"{urls[k % len(urls)]} returned {res.status_code}")
+            results[f"api.{name}.p50_ms"] = metric(statistics.median(samples), "ms", "lower")
+            results[f"api.{name}.p95_ms"] = metric(percentile(samples, 95), "ms", "lower")
+        samples = []
+        for _ in range(ctx.args.api_requests):
+            started = time.perf_counter()
+            client.get("/api/fatawa?limit=20&total=none")
+            samples.append((time.perf_counter() - started) * 1000)
+        results["api.cached_hit.p50_ms"] = metric(statistics.median(samples), "ms", "lower")
+    return results
+
+
+BENCHMARKS = {
+    "extract": bench_extract,
+    "generate": bench_generate,
+    "classify": bench_classify,
+    "build": bench_build,
+    "api": bench_api,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run offline QuranQA benchmarks")
+    parser.add_argument("--size", choices=sorted(SIZES), default="10k", help="Synthetic corpus size")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Corpus seed")
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help=f"Comma-separated subset of: {','.join(BENCHMARKS)}",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per throughput benchmark (best is kept)")
+    parser.add_argument("--extract-pages", type=int, default=2000, help="Synthetic pages per extraction run")
+    parser.add_argument("--api-requests", type=int, default=200, help="Requests per API case")
+    parser.add_argument("--work-dir", default=str(DATA_DIR), help="Corpus, drafts and DB cache directory")
+    parser.add_argument("--output", default="", help="Results JSON (default: bench/results/latest_<size>.json)")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Also store the results as bench/results/baseline_<size>.json for bench.compare",
+    )
+    args = parser.parse_args()
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {','.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    ctx = Context(args)
+    metrics: dict[str, dict] = {}
+    for name in selected:
+        stage_started = time.perf_counter()
+        metrics.update(BENCHMARKS[name](ctx))
+        print(f"bench={name} seconds={time.perf_counter() - stage_started:.2f}")
+
+    results = {
+        "meta": {
+            "size": args.size,
+            "entries": ctx.entries,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "git_commit": git_commit(),
+            "created_at_unix": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "metrics": metrics,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"latest_{args.size}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    text = json.dumps(results, indent=2) + "\n"
+    output.write_text(text, encoding="utf-8")
+    if args.save_baseline:
+        (RESULTS_DIR / f"baseline_{args.size}.json").write_text(text, encoding="utf-8")
+    for key, m in metrics.items():
+        print(f"{key}={m['value']} {m['unit']}")
+    print(f"done benchmarks={','.join(selected)} seconds={time.perf_counter() - started:.2f} output={output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,19 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
 import sqlite3
 import time
+from itertools import islice
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from profiling import STAGES, add_profile_args, start_profiler
+from quran_refs import parse_verse_ref
+from related import neighbors_missing, rebuild_neighbors, update_neighbors
+from search_text import fold
 
 
 DDL = """
@@ -26,11 +35,16 @@ CREATE TABLE IF NOT EXISTS fatawa (
     source_org TEXT,
     generated_at_unix INTEGER,
     scraped_at_unix INTEGER,
-    created_at_unix INTEGER NOT NULL
+    created_at_unix INTEGER NOT NULL,
+    row_hash TEXT,
+    canonical_url TEXT,
+    topic_confidence REAL,
+    updated_at_unix INTEGER
 );
 
-CREATE INDEX IF NOT EXISTS idx_fatawa_topic ON fatawa(topic);
+CREATE INDEX IF NOT EXISTS idx_fatawa_topic_id ON fatawa(topic, id);
 CREATE INDEX IF NOT EXISTS idx_fatawa_madhhab ON fatawa(madhhab);
+CREATE INDEX IF NOT EXISTS idx_fatawa_generated_at ON fatawa(generated_at_unix);
 
 CREATE TABLE IF NOT EXISTS feedback (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,17 +53,414 @@ CREATE TABLE IF NOT EXISTS feedback (
     created_at_unix INTEGER NOT NULL,
     FOREIGN KEY (fatwa_id) REFERENCES fatawa(id)
 );
+
+CREATE INDEX IF NOT EXISTS idx_feedback_fatwa_id ON feedback(fatwa_id, id);
+
+-- generation: bumped by every write that changes what the API would return.
+CREATE TABLE IF NOT EXISTS db_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- One row per cited verse range, parsed from quran_references_json.
+CREATE TABLE IF NOT EXISTS fatwa_verses (
+    fatwa_id INTEGER NOT NULL,
+    surah INTEGER NOT NULL,
+    ayah_start INTEGER NOT NULL,
+    ayah_end INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_fatwa_verses_verse ON fatwa_verses(surah, ayah_start, ayah_end, fatwa_id);
+CREATE INDEX IF NOT EXISTS idx_fatwa_verses_fatwa ON fatwa_verses(fatwa_id);
+
+-- Top-k TF-IDF neighbours per fatwa (scripts/related.py); rank 1 is the most similar.
+CREATE TABLE IF NOT EXISTS fatwa_neighbors (
+    fatwa_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    neighbor_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (fatwa_id, rank)
+) WITHOUT ROWID;
+
+-- Fatawa whose neighbour lists may be out of date; filled by syncs and deletes, emptied by refresh_neighbors.
+CREATE TABLE IF NOT EXISTS fatwa_neighbors_dirty (
+    fatwa_id INTEGER PRIMARY KEY
+);
+
+-- Folded copies of the searchable columns; rowid = fatawa.id.
+CREATE VIRTUAL TABLE IF NOT EXISTS fatawa_fts USING fts5(
+    title, question_summary, draft_fatwa_text,
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+# Columns added after the first release; created on older DBs by `migrate`.
+ADDED_COLUMNS = {
+    "fatawa": [
+        ("row_hash", "TEXT"),
+        ("canonical_url", "TEXT"),
+        ("topic_confidence", "REAL"),
+        ("updated_at_unix", "INTEGER"),
+    ],
+}
+# Values given to existing rows when `migrate` adds the column.
+COLUMN_BACKFILLS = {
+    ("fatawa", "updated_at_unix"): "COALESCE(generated_at_unix, created_at_unix)",
+}
+# Indexes on ADDED_COLUMNS; created by `migrate` since DDL runs before the columns exist.
+ADDED_INDEXES = {
+    "idx_fatawa_updated_at": "fatawa(updated_at_unix, id)",
+}
+# Bump when a derived table (fatawa_fts, fatwa_verses) is added or its contents
+# change shape; DBs with an older db_meta.derived_version are reindexed in full.
+DERIVED_VERSION = 2
+
+# Indexes made redundant by a wider one in DDL; dropped on older DBs by `migrate`.
+SUPERSEDED_INDEXES = ["idx_fatawa_topic"]
+
+UPSERT_SQL = """
+INSERT INTO fatawa (
+    url, title, question_summary, source_answer, raw_text, topic, draft_fatwa_text,
+    quran_references_json, principles_json, madhhab, source_org,
+    generated_at_unix, scraped_at_unix, canonical_url, topic_confidence, created_at_unix, updated_at_unix,
+    row_hash
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(url) DO UPDATE SET
+    title=excluded.title,
+    question_summary=excluded.question_summary,
+    source_answer=excluded.source_answer,
+    raw_text=excluded.raw_text,
+    topic=excluded.topic,
+    draft_fatwa_text=excluded.draft_fatwa_text,
+    quran_references_json=excluded.quran_references_json,
+    principles_json=excluded.principles_json,
+    madhhab=excluded.madhhab,
+    source_org=excluded.source_org,
+    generated_at_unix=excluded.generated_at_unix,
+    scraped_at_unix=excluded.scraped_at_unix,
+    canonical_url=excluded.canonical_url,
+    topic_confidence=excluded.topic_confidence,
+    updated_at_unix=excluded.updated_at_unix,
+    row_hash=excluded.row_hash;
 """
 
+# Applied for the duration of a build, then put back to what the DB had. An
+# existing DB may be live and hold feedback, so syncing it in place keeps WAL's
+# crash-safe NORMAL; only a fresh build, written to a temp file that replaces
+# the target once complete, skips fsync altogether.
+BUILD_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -262144,
+    "temp_store": "FILE",
+}
+FRESH_BUILD_PRAGMAS = {**BUILD_PRAGMAS, "synchronous": "OFF"}
+
 
-def load_jsonl(path: Path) -> list[dict]:
-    rows = []
+def migrate(conn: sqlite3.Connection) -> None:
+    for table, columns in ADDED_COLUMNS.items():
+        have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns:
+            if name not in have:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+                if (table, name) in COLUMN_BACKFILLS:
+                    conn.execute(f"UPDATE {table} SET {name} = {COLUMN_BACKFILLS[table, name]}")
+    for name, target in ADDED_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    for name in SUPERSEDED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('generation', 0)")
+    conn.commit()
+
+
+def bump_generation(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        INSERT INTO db_meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        """
+    )
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict) -> dict:
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = conn.execute(f"PRAGMA {name}").fetchone()[0]
+        conn.execute(f"PRAGMA {name}={value}")
+    return previous
+
+
+def restore_pragmas(conn: sqlite3.Connection, previous: dict) -> None:
+    for name, value in previous.items():
+        try:
+            conn.execute(f"PRAGMA {name}={value}")
+        except sqlite3.OperationalError as exc:
+            print(f"warning: could not restore PRAGMA {name}={value}: {exc}")
+
+
+def remove_db_files(path: Path, suffixes: tuple[str, ...] = ("", "-wal", "-shm")) -> None:
+    for suffix in suffixes:
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+def iter_jsonl_offsets(path: Path) -> Iterator[tuple[int, bytes]]:
+    offset = 0
+    with path.open("rb") as f:
+        for line in f:
+            start = offset
+            offset += len(line)
+            if line.strip():
+                yield start, line
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def index_scraped(conn: sqlite3.Connection, path: Path, batch_size: int) -> int:
+    """Record url -> byte offset of the scraped JSONL in a temp table; later lines win."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS scraped_index (url TEXT PRIMARY KEY, offset INTEGER NOT NULL)")
+    conn.execute("DELETE FROM scraped_index")
+    indexed = 0
+    for batch in iter_batches(iter_jsonl_offsets(path), batch_size):
+        pairs = []
+        for offset, line in batch:
+            url = json.loads(line).get("url")
+            if url:
+                pairs.append((url, offset))
+        conn.executemany("INSERT OR REPLACE INTO scraped_index (url, offset) VALUES (?, ?)", pairs)
+        indexed += len(pairs)
+    return indexed
+
+
+def lookup_scraped(conn: sqlite3.Connection, src: BinaryIO, urls: list[str]) -> dict[str, dict]:
+    """Load the scraped rows for `urls`, reading the JSONL in offset order."""
+    found = {}
+    for chunk in iter_batches(urls, 500):
+        rows = conn.execute(
+            f"SELECT url, offset FROM scraped_index WHERE url IN ({','.join('?' * len(chunk))}) ORDER BY offset",
+            chunk,
+        ).fetchall()
+        for url, offset in rows:
+            src.seek(offset)
+            found[url] = json.loads(src.readline())
+    return found
+
+
+def load_canonical_map(path: Path) -> dict[str, str]:
+    """url -> canonical_url for the non-canonical members in a dedup_questions.py map."""
+    mapping = {}
     with path.open("r", encoding="utf-8") as f:
         for line in f:
-            line = line.strip()
-            if line:
-                rows.append(json.loads(line))
-    return rows
+            if line.strip():
+                row = json.loads(line)
+                if row["url"] != row["canonical_url"]:
+                    mapping[row["url"]] = row["canonical_url"]
+    return mapping
+
+
+def build_row(draft: dict, src: dict, now: int, canonical_url: Optional[str] = None) -> tuple:
+    """Return the UPSERT_SQL parameters; the trailing row_hash covers every content column.
+
+    `now` fills both created_at_unix and updated_at_unix; the UPSERT keeps the
+    original created_at_unix, and sync_batch only writes new or changed rows,
+    so updated_at_unix moves exactly when a row's content does.
+    """
+    content = (
+        draft["url"],
+        draft.get("title") or src.get("title"),
+        draft.get("question_summary") or src.get("question"),
+        src.get("source_answer", ""),
+        src.get("raw_text", ""),
+        draft.get("topic", ""),
+        draft.get("draft_fatwa_text", ""),
+        json.dumps(draft.get("quran_references", []), ensure_ascii=False),
+        json.dumps(draft.get("neo_mutazili_principles", []), ensure_ascii=False),
+        src.get("madhhab", ""),
+        src.get("source", ""),
+        draft.get("generated_at_unix"),
+        src.get("scraped_at_unix"),
+        canonical_url,
+        draft.get("topic_confidence"),
+    )
+    row_hash = hashlib.sha256(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return (*content, now, now, row_hash)
+
+
+def sync_batch(conn: sqlite3.Connection, rows: list[tuple], stats: dict) -> list[str]:
+    """Upsert only rows that are new or whose row_hash changed; returns their URLs."""
+    urls = [row[0] for row in rows]
+    existing = dict(
+        conn.execute(
+            f"SELECT url, row_hash FROM fatawa WHERE url IN ({','.join('?' * len(urls))})",
+            urls,
+        )
+    )
+    changed = []
+    for row in rows:
+        url, row_hash = row[0], row[-1]
+        if url not in existing:
+            stats["inserted"] += 1
+        elif existing[url] != row_hash:
+            stats["updated"] += 1
+        else:
+            stats["unchanged"] += 1
+            continue
+        existing[url] = row_hash
+        changed.append(row)
+    if changed:
+        conn.executemany(UPSERT_SQL, changed)
+    return [row[0] for row in changed]
+
+
+DERIVED_COLUMNS_SQL = "SELECT id, title, question_summary, draft_fatwa_text, quran_references_json FROM fatawa"
+
+
+def index_search(conn: sqlite3.Connection, rows: list[tuple]) -> None:
+    """Replace the fatawa_fts entries for DERIVED_COLUMNS_SQL rows."""
+    folded = [(r[0], fold(r[1]), fold(r[2]), fold(r[3])) for r in rows]
+    conn.executemany("DELETE FROM fatawa_fts WHERE rowid = ?", [(r[0],) for r in rows])
+    conn.executemany(
+        "INSERT INTO fatawa_fts (rowid, title, question_summary, draft_fatwa_text) VALUES (?, ?, ?, ?)",
+        folded,
+    )
+
+
+def index_verses(conn: sqlite3.Connection, rows: list[tuple]) -> None:
+    """Replace the fatwa_verses ranges for DERIVED_COLUMNS_SQL rows; malformed refs are skipped."""
+    verses = []
+    for r in rows:
+        try:
+            refs = json.loads(r[4] or "[]")
+        except json.JSONDecodeError:
+            refs = []
+        for ref in refs if isinstance(refs, list) else []:
+            parsed = parse_verse_ref(ref) if isinstance(ref, str) else None
+            if parsed:
+                verses.append((r[0], *parsed))
+    conn.executemany("DELETE FROM fatwa_verses WHERE fatwa_id = ?", [(r[0],) for r in rows])
+    conn.executemany(
+        "INSERT INTO fatwa_verses (fatwa_id, surah, ayah_start, ayah_end) VALUES (?, ?, ?, ?)", verses
+    )
+
+
+def index_derived(conn: sqlite3.Connection, rows: list[tuple]) -> int:
+    index_search(conn, rows)
+    index_verses(conn, rows)
+    return len(rows)
+
+
+def index_derived_urls(conn: sqlite3.Connection, urls: list[str]) -> int:
+    if not urls:
+        return 0
+    rows = conn.execute(f"{DERIVED_COLUMNS_SQL} WHERE url IN ({','.join('?' * len(urls))})", urls)
+    return index_derived(conn, rows.fetchall())
+
+
+def rebuild_derived(conn: sqlite3.Connection, batch_size: int) -> int:
+    """Reindex every fatawa row; run when db_meta.derived_version is behind DERIVED_VERSION."""
+    conn.execute("DELETE FROM fatawa_fts")
+    conn.execute("DELETE FROM fatwa_verses")
+    indexed = last_id = 0
+    while True:
+        batch = conn.execute(
+            f"{DERIVED_COLUMNS_SQL} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        indexed += index_derived(conn, batch)
+        last_id = batch[-1][0]
+    conn.execute(
+        """
+        INSERT INTO db_meta (key, value) VALUES ('derived_version', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """,
+        (DERIVED_VERSION,),
+    )
+    return indexed
+
+
+def delete_missing(conn: sqlite3.Connection) -> int:
+    """Delete fatawa (and their feedback) whose URL was not in this build's drafts.
+
+    Neighbour rows pointing either way are removed too, so a build with
+    `--related-k 0` (no neighbour refresh) never serves a deleted fatwa; the
+    rows that lost a neighbour are marked for the next refresh.
+    """
+    stale = "SELECT id FROM fatawa WHERE url NOT IN (SELECT url FROM temp.seen_urls)"
+    conn.execute(f"DELETE FROM fatawa_fts WHERE rowid IN ({stale})")
+    conn.execute(f"DELETE FROM fatwa_verses WHERE fatwa_id IN ({stale})")
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO fatwa_neighbors_dirty (fatwa_id)
+        SELECT DISTINCT fatwa_id FROM fatwa_neighbors WHERE neighbor_id IN ({stale}) AND fatwa_id NOT IN ({stale})
+        """
+    )
+    conn.execute(f"DELETE FROM fatwa_neighbors_dirty WHERE fatwa_id IN ({stale})")
+    conn.execute(f"DELETE FROM fatwa_neighbors WHERE fatwa_id IN ({stale}) OR neighbor_id IN ({stale})")
+    conn.execute(f"DELETE FROM feedback WHERE fatwa_id IN ({stale})")
+    return conn.execute(f"DELETE FROM fatawa WHERE id IN ({stale})").rowcount
+
+
+def open_db(path: Path, batch_size: int) -> sqlite3.Connection:
+    """Connect, create/migrate the schema and rebuild derived tables if their format changed."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    # WAL persists in the file; the API's read-only connections rely on it to read during builds.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(DDL)
+    migrate(conn)
+    with conn:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'derived_version'").fetchone()
+        if (row[0] if row else 0) < DERIVED_VERSION and rebuild_derived(conn, batch_size):
+            bump_generation(conn)
+    return conn
+
+
+def sync_rows(conn: sqlite3.Connection, rows: list[tuple], stats: dict[str, int]) -> list[str]:
+    """Upsert built rows and their derived index entries in one short transaction."""
+    with conn:
+        with STAGES.time("insert"):
+            changed = sync_batch(conn, rows, stats)
+        if changed:
+            with STAGES.time("index_derived"):
+                index_derived_urls(conn, changed)
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO fatwa_neighbors_dirty (fatwa_id)
+                SELECT id FROM fatawa WHERE url IN ({','.join('?' * len(changed))})
+                """,
+                changed,
+            )
+            bump_generation(conn)
+        committing = time.perf_counter()
+    STAGES.add("commit", time.perf_counter() - committing)
+    return changed
+
+
+def refresh_neighbors(conn: sqlite3.Connection, k: int, block_mb: int, full: bool = False) -> int:
+    """Bring fatwa_neighbors up to date; returns the number of fatawa whose lists were recomputed.
+
+    Only rows affected by the changes since the last refresh are recomputed
+    (see related.update_neighbors). The whole table is rebuilt when it was
+    never filled or `full` is set.
+    """
+    if k <= 0:
+        return 0
+    if full or neighbors_missing(conn):
+        rebuild_neighbors(conn, k, block_mb)
+        refreshed = conn.execute("SELECT COUNT(*) FROM fatawa").fetchone()[0]
+    else:
+        refreshed, _ = update_neighbors(conn, k, block_mb)
+    if refreshed:
+        with conn:
+            bump_generation(conn)
+    return refreshed
 
 
 def main() -> None:
@@ -57,73 +468,94 @@ def main() -> None:
     parser.add_argument("--scraped", required=True, help="Path to islamqa_org_queries.jsonl")
     parser.add_argument("--drafts", required=True, help="Path to mutazili_drafts.jsonl")
     parser.add_argument("--db", required=True, help="Output SQLite file path")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per executemany/commit")
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Delete rows (and their feedback) whose URL no longer appears in --drafts",
+    )
+    parser.add_argument(
+        "--dedup-map",
+        help="dedup_questions.py output; sets canonical_url on near-duplicate rows (NULL = canonical)",
+    )
+    parser.add_argument("--related-k", type=int, default=10, help="TF-IDF neighbours stored per fatwa (0 = skip)")
+    parser.add_argument(
+        "--related-block-mb", type=int, default=256, help="Memory cap for each dense similarity block"
+    )
+    parser.add_argument(
+        "--related-rebuild",
+        action="store_true",
+        help="Recompute every fatwa's neighbours (e.g. after changing --related-k) instead of only affected ones",
+    )
+    add_profile_args(parser)
     args = parser.parse_args()
+    start_profiler(args)
 
     scraped_path = Path(args.scraped)
     drafts_path = Path(args.drafts)
     db_path = Path(args.db)
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+    canonical = load_canonical_map(Path(args.dedup_map)) if args.dedup_map else {}
 
-    scraped_rows = load_jsonl(scraped_path)
-    draft_rows = load_jsonl(drafts_path)
-    by_url = {row.get("url"): row for row in scraped_rows if row.get("url")}
-
-    conn = sqlite3.connect(db_path)
-    conn.executescript(DDL)
+    fresh = not db_path.exists()
+    build_path = db_path.with_name(db_path.name + ".building") if fresh else db_path
+    if fresh:
+        remove_db_files(build_path)
+    with STAGES.time("open"):
+        conn = open_db(build_path, args.batch_size)
+    previous_pragmas = apply_pragmas(conn, FRESH_BUILD_PRAGMAS if fresh else BUILD_PRAGMAS)
 
+    started = time.perf_counter()
     now = int(time.time())
-    upsert_sql = """
-    INSERT INTO fatawa (
-        url, title, question_summary, source_answer, raw_text, topic, draft_fatwa_text,
-        quran_references_json, principles_json, madhhab, source_org,
-        generated_at_unix, scraped_at_unix, created_at_unix
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ON CONFLICT(url) DO UPDATE SET
-        title=excluded.title,
-        question_summary=excluded.question_summary,
-        source_answer=excluded.source_answer,
-        raw_text=excluded.raw_text,
-        topic=excluded.topic,
-        draft_fatwa_text=excluded.draft_fatwa_text,
-        quran_references_json=excluded.quran_references_json,
-        principles_json=excluded.principles_json,
-        madhhab=excluded.madhhab,
-        source_org=excluded.source_org,
-        generated_at_unix=excluded.generated_at_unix,
-        scraped_at_unix=excluded.scraped_at_unix;
-    """
-
-    inserted = 0
-    with conn:
-        for draft in draft_rows:
-            url = draft.get("url")
-            if not url:
-                continue
-            src = by_url.get(url, {})
-            conn.execute(
-                upsert_sql,
-                (
-                    url,
-                    draft.get("title") or src.get("title"),
-                    draft.get("question_summary") or src.get("question"),
-                    src.get("source_answer", ""),
-                    src.get("raw_text", ""),
-                    draft.get("topic", ""),
-                    draft.get("draft_fatwa_text", ""),
-                    json.dumps(draft.get("quran_references", []), ensure_ascii=False),
-                    json.dumps(draft.get("neo_mutazili_principles", []), ensure_ascii=False),
-                    src.get("madhhab", ""),
-                    src.get("source", ""),
-                    draft.get("generated_at_unix"),
-                    src.get("scraped_at_unix"),
-                    now,
-                ),
-            )
-            inserted += 1
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    processed = 0
+    try:
+        with conn:
+            with STAGES.time("index_scraped"):
+                indexed = index_scraped(conn, scraped_path, args.batch_size)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_urls (url TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM seen_urls")
+        drafts = (json.loads(line) for _, line in iter_jsonl_offsets(drafts_path))
+        with scraped_path.open("rb") as src:
+            for batch in iter_batches((d for d in drafts if d.get("url")), args.batch_size):
+                with STAGES.time("lookup"):
+                    by_url = lookup_scraped(conn, src, [d["url"] for d in batch])
+                with STAGES.time("build_rows"):
+                    rows = [build_row(d, by_url.get(d["url"], {}), now, canonical.get(d["url"])) for d in batch]
+                # One short transaction per batch so readers are never stalled behind the whole build.
+                sync_rows(conn, rows, stats)
+                if args.delete_missing:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO seen_urls (url) VALUES (?)", [(d["url"],) for d in batch]
+                        )
+                processed += len(batch)
+        if args.delete_missing:
+            with conn, STAGES.time("delete"):
+                stats["deleted"] = delete_missing(conn)
+                if stats["deleted"]:
+                    bump_generation(conn)
+        related = refresh_neighbors(conn, args.related_k, args.related_block_mb, args.related_rebuild)
+        conn.execute("DROP TABLE IF EXISTS temp.scraped_index")
+        conn.execute("DROP TABLE IF EXISTS temp.seen_urls")
+    finally:
+        restore_pragmas(conn, previous_pragmas)
 
+    elapsed = max(time.perf_counter() - started, 1e-9)
     total = conn.execute("SELECT COUNT(*) FROM fatawa").fetchone()[0]
+    if fresh:
+        # synchronous is back to the default, so this checkpoint is fsynced before the rename publishes the file.
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     conn.close()
-    print(f"done inserted_or_updated={inserted} total={total} db={db_path}")
+    if fresh:
+        # A stale -wal/-shm next to the target would be replayed into the new file.
+        remove_db_files(db_path, ("-wal", "-shm"))
+        os.replace(build_path, db_path)
+    STAGES.print_report()
+    print(
+        f"done inserted={stats['inserted']} updated={stats['updated']} unchanged={stats['unchanged']} "
+        f"deleted={stats['deleted']} total={total} indexed_scraped={indexed} related={related} "
+        f"seconds={elapsed:.2f} rows_per_sec={processed / elapsed:.0f} db={db_path}"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+"""Persistent per-URL crawl state and work queue used for delta and resumed scrapes."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+
+DDL = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    content_hash TEXT,
+    fetched_at_unix INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS queue (
+    url TEXT PRIMARY KEY,
+    lastmod TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at_unix INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_queue_status ON queue(status, next_attempt_at);
+"""
+
+
+class CrawlState:
+    """SQLite store of url -> (sitemap lastmod, content hash, fetch time).
+
+    The `queue` table tracks pending/done/failed URLs with retry counts and
+    backoff so an interrupted run can be resumed. Writes are batched; call
+    `flush` only after the matching output lines are durable.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(DDL)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM pages LIMIT 1").fetchone() is None
+
+    def import_urls(self, urls: Iterable[str]) -> int:
+        """Seed state from a legacy output file that only recorded URLs."""
+        with self._lock, self._conn:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (url) VALUES (?)", ((u,) for u in urls)
+            )
+            return cur.rowcount
+
+    def needs_fetch(self, url: str, lastmod: str) -> bool:
+        """True for unseen URLs and for URLs whose sitemap lastmod moved.
+
+        Rows imported without a lastmod adopt the first one seen instead of
+        forcing a full recrawl. A URL whose fetch failed at this lastmod is
+        skipped while its retry backoff runs, and for good once it gave up.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT lastmod FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                if row[0] is None:
+                    if lastmod:
+                        self._conn.execute("UPDATE pages SET lastmod = ? WHERE url = ?", (lastmod, url))
+                    return False
+                if not lastmod or row[0] == lastmod:
+                    return False
+            queued = self._conn.execute(
+                "SELECT status, next_attempt_at FROM queue WHERE url = ? AND lastmod IS ?", (url, lastmod or None)
+            ).fetchone()
+            if queued is None:
+                return True
+            status, next_attempt_at = queued
+            return status == "done" or (status == "pending" and next_attempt_at <= time.time())
+
+    def record(self, url: str, lastmod: Optional[str], content_hash: str, fetched_at_unix: int) -> bool:
+        """Store a fetch result; returns False when the content hash is unchanged."""
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT INTO pages (url, lastmod, content_hash, fetched_at_unix)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    lastmod=COALESCE(excluded.lastmod, pages.lastmod),
+                    content_hash=excluded.content_hash,
+                    fetched_at_unix=excluded.fetched_at_unix
+                """,
+                (url, lastmod or None, content_hash, fetched_at_unix),
+            )
+            return row is None or row[0] != content_hash
+
+    def enqueue(self, url: str, lastmod: str) -> None:
+        """Queue a URL as pending; a URL that already failed keeps its attempts and backoff until its lastmod moves."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO queue (url, lastmod, status, attempts, next_attempt_at, enqueued_at_unix)
+                VALUES (?, ?, 'pending', 0, 0, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    lastmod=excluded.lastmod,
+                    status='pending',
+                    attempts=CASE
+                        WHEN queue.status = 'pending' THEN queue.attempts
+                        WHEN queue.status = 'failed' AND queue.lastmod IS excluded.lastmod THEN queue.attempts
+                        ELSE 0
+                    END,
+                    next_attempt_at=CASE
+                        WHEN queue.status = 'pending' THEN queue.next_attempt_at
+                        WHEN queue.status = 'failed' AND queue.lastmod IS excluded.lastmod THEN queue.next_attempt_at
+                        ELSE 0
+                    END
+                """,
+                (url, lastmod or None, int(time.time())),
+            )
+
+    def iter_backlog(self, batch: int = 1000) -> Iterator[tuple[str, str]]:
+        """Yield (url, lastmod) for pending work whose backoff has elapsed, oldest first."""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    """
+                    SELECT rowid, url, lastmod FROM queue
+                    WHERE status = 'pending' AND next_attempt_at <= ? AND rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                    """,
+                    (time.time(), last_rowid, batch),
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, url, lastmod in rows:
+                last_rowid = rowid
+                yield url, lastmod or ""
+
+    def mark_done(self, url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue SET status = 'done', last_error = NULL WHERE url = ?", (url,)
+            )
+
+    def mark_failed(self, url: str, error: str, max_attempts: int, backoff_base: float) -> None:
+        """Schedule a retry with exponential backoff, or give up after `max_attempts`."""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM queue WHERE url = ?", (url,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            status = "failed" if attempts >= max_attempts else "pending"
+            self._conn.execute(
+                """
+                UPDATE queue
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE url = ?
+                """,
+                (status, attempts, time.time() + backoff_base * 2 ** (attempts - 1), error, url),
+            )
+
+    def queue_counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall()
+        return dict(rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        """Drop writes since the last `flush`, e.g. when their output never became durable."""
+        with self._lock:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
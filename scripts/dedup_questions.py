@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Cluster near-duplicate scraped questions with MinHash signatures and LSH banding."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from profiling import STAGES, add_profile_args, start_profiler
+from search_text import fold
+
+_SPACE_RE = re.compile(r"\W+")
+# Text hashed per vectorised batch; the (num_perm x windows) uint64 scratch
+# matrix is about num_perm * 8 times this size.
+HASH_BATCH_BYTES = 64 * 1024
+# Entries with less body text than this (empty and title-only pages) share too
+# few shingles to compare and are never clustered.
+MIN_BODY_BYTES = 64
+# LSH buckets larger than this only pair rows this close in sort order.
+MAX_BUCKET = 100
+
+
+def _dedup_fold(text: str) -> bytes:
+    return _SPACE_RE.sub(" ", fold(text).lower()).strip().encode("utf-8")
+
+
+def dedup_body(entry: dict) -> bytes:
+    """Question plus answer, case/diacritic folded and with punctuation collapsed."""
+    return _dedup_fold(entry.get("raw_text") or f"{entry.get('question', '')} {entry.get('source_answer', '')}")
+
+
+def dedup_text(entry: dict) -> bytes:
+    """Title plus `dedup_body`, folded the same way."""
+    title = _dedup_fold(entry.get("title") or "")
+    body = dedup_body(entry)
+    return b" ".join(part for part in (title, body) if part)
+
+
+def shingle_hashes(docs: list[bytes], k: int) -> tuple[np.ndarray, np.ndarray]:
+    """32-bit hashes of every k-byte window in `docs`, and the doc index of each.
+
+    One polynomial rolling hash runs over the concatenated batch; windows that
+    straddle two documents are dropped. Repeated shingles are kept, since they
+    cannot change a minimum.
+    """
+    lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+    buf = np.frombuffer(b"".join(docs), dtype=np.uint8).astype(np.uint64)
+    n = len(buf) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        h = h * np.uint64(1099511628211) + buf[j : j + n]
+    doc = np.repeat(np.arange(len(docs)), lengths)[:n]
+    ends = np.cumsum(lengths)
+    valid = np.arange(n) + k <= ends[doc]
+    h = h[valid]
+    return (h ^ (h >> np.uint64(32))) & np.uint64(0xFFFFFFFF), doc[valid]
+
+
+class MinHasher:
+    """One-permutation MinHash: each shingle is hashed once and lands in one of `num_perm` bins.
+
+    A signature keeps the minimum per bin, which estimates Jaccard similarity
+    like `num_perm` independent hash functions at 1/num_perm of the cost.
+    Empty bins borrow the next filled bin to the right (rotation
+    densification) so short texts still compare bin-for-bin.
+    """
+
+    def __init__(self, num_perm: int, seed: int, shingle_bytes: int) -> None:
+        rng = np.random.default_rng(seed)
+        self.a, self.b = (rng.integers(1, 2**63, size=2, dtype=np.uint64) | np.uint64(1))
+        self.num_perm = num_perm
+        self.shingle_bytes = shingle_bytes
+
+    def signatures(self, docs: list[bytes]) -> np.ndarray:
+        """(len(docs), num_perm) uint32 signatures.
+
+        Docs shorter than a shingle get identical all-max rows, so callers keep
+        them (see MIN_BODY_BYTES) out of LSH.
+        """
+        p = self.num_perm
+        empty_value = np.iinfo(np.uint32).max
+        out = np.full(len(docs) * p, empty_value, dtype=np.uint32)
+        shingles, doc = shingle_hashes(docs, self.shingle_bytes)
+        if len(shingles):
+            h = shingles * self.a + self.b
+            h ^= h >> np.uint64(31)
+            h *= self.b
+            h ^= h >> np.uint64(29)
+            bins = ((h >> np.uint64(32)) * np.uint64(p)) >> np.uint64(32)
+            np.minimum.at(out, doc * p + bins.astype(np.int64), (h & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+        return densify(out.reshape(len(docs), p), empty_value)
+
+
+def densify(sig: np.ndarray, empty_value: int) -> np.ndarray:
+    """Fill each empty bin from the nearest filled bin to its right (circularly), offset by distance."""
+    empty = sig == empty_value
+    if not empty.any():
+        return sig
+    n, p = sig.shape
+    cols = np.arange(p)
+    pos = np.where(empty, 2 * p, cols)
+    both = np.concatenate([pos, np.where(empty, 2 * p, cols + p)], axis=1)
+    nearest = np.minimum.accumulate(both[:, ::-1], axis=1)[:, ::-1][:, :p]
+    filled = nearest < 2 * p
+    source = np.take_along_axis(sig, np.where(filled, nearest % p, 0), axis=1)
+    shift = ((nearest - cols) * 0x9E3779B1).astype(np.uint32)
+    return np.where(empty & filled, source + shift, sig)
+
+
+def iter_entries(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int, seed: int, max_bucket: int = MAX_BUCKET) -> np.ndarray:
+    """(i, j) pairs sharing at least one LSH band, from a sort per band instead of a hash table.
+
+    Within a band, rows with equal band hashes form a run after sorting and
+    every pair in a run is returned. Runs longer than `max_bucket` only pair
+    rows fewer than `max_bucket` places apart, which bounds the work.
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    mix = np.random.default_rng(seed + 1).integers(1, 2**63, size=rows, dtype=np.uint64) | np.uint64(1)
+    sig = signatures.astype(np.uint64)
+    pairs = []
+    for band in range(bands):
+        keys = (sig[:, band * rows : (band + 1) * rows] * mix).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        longest = int(np.diff(np.r_[starts, n]).max()) if n else 0
+        for gap in range(1, min(longest, max_bucket)):
+            same = sorted_keys[gap:] == sorted_keys[:-gap]
+            pairs.append(np.stack([order[:-gap][same], order[gap:][same]], axis=1))
+    found = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    found.sort(axis=1)
+    return np.unique(found, axis=0)
+
+
+def cluster(signatures: np.ndarray, pairs: np.ndarray, threshold: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return (component label per doc, estimated Jaccard per kept pair) for pairs at or above `threshold`."""
+    n = len(signatures)
+    if len(pairs):
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        keep = similarity >= threshold
+        pairs, similarity = pairs[keep], similarity[keep]
+    else:
+        similarity = np.empty(0)
+    graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels, similarity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Find near-duplicate scraped questions with MinHash/LSH")
+    parser.add_argument("--input", required=True, help="Scraped islamqa_org_queries.jsonl")
+    parser.add_argument("--output", required=True, help="Output JSONL: url -> canonical_url for duplicate clusters")
+    parser.add_argument("--shingle-bytes", type=int, default=9, help="Shingle width in UTF-8 bytes")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash signature length")
+    parser.add_argument("--bands", type=int, default=16, help="LSH bands (num-perm must divide evenly)")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Min estimated Jaccard to link two entries")
+    parser.add_argument("--seed", type=int, default=1, help="Hash seed; keep fixed for stable canonicals")
+    parser.add_argument(
+        "--min-body-bytes",
+        type=int,
+        default=MIN_BODY_BYTES,
+        help="Entries with less folded question/answer text are never clustered (empty and title-only pages)",
+    )
+    parser.add_argument(
+        "--max-bucket", type=int, default=MAX_BUCKET, help="LSH buckets larger than this are only partly compared"
+    )
+    add_profile_args(parser)
+    args = parser.parse_args()
+    start_profiler(args)
+    if args.num_perm % args.bands:
+        parser.error("--num-perm must be a multiple of --bands")
+    if args.max_bucket < 2:
+        parser.error("--max-bucket must be at least 2")
+    min_body_bytes = max(args.min_body_bytes, args.shingle_bytes)
+
+    started = time.perf_counter()
+    hasher = MinHasher(args.num_perm, args.seed, args.shingle_bytes)
+    urls: list[str] = []
+    signatures = []
+    batch: list[bytes] = []
+    batch_bytes = 0
+    entries = skipped = 0
+    for entry in iter_entries(Path(args.input)):
+        if not entry.get("url"):
+            continue
+        entries += 1
+        # Short entries would all get the same empty signature and cluster together.
+        if len(dedup_body(entry)) < min_body_bytes:
+            skipped += 1
+            continue
+        urls.append(entry["url"])
+        batch.append(dedup_text(entry))
+        batch_bytes += len(batch[-1])
+        if batch_bytes >= HASH_BATCH_BYTES:
+            with STAGES.time("minhash"):
+                signatures.append(hasher.signatures(batch))
+            batch, batch_bytes = [], 0
+    if batch:
+        with STAGES.time("minhash"):
+            signatures.append(hasher.signatures(batch))
+    sig = np.vstack(signatures) if signatures else np.empty((0, args.num_perm), dtype=np.uint32)
+    hashed_at = time.perf_counter()
+
+    with STAGES.time("lsh"):
+        pairs = candidate_pairs(sig, args.bands, args.seed, args.max_bucket)
+    with STAGES.time("cluster"):
+        labels, _ = cluster(sig, pairs, args.threshold)
+
+    # The earliest entry in the input is each cluster's canonical member.
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    out_path = Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    clusters = duplicates = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for start, size in zip(starts, sizes):
+            if size < 2:
+                continue
+            members = order[start : start + size]
+            canonical = urls[members[0]]
+            clusters += 1
+            duplicates += size - 1
+            for i in members:
+                f.write(
+                    json.dumps(
+                        {"url": urls[i], "canonical_url": canonical, "cluster_size": int(size)},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    STAGES.print_report()
+    print(
+        f"done entries={entries} short_skipped={skipped} clusters={clusters} duplicates={duplicates} "
+        f"candidate_pairs={len(pairs)} hash_seconds={hashed_at - started:.2f} "
+        f"seconds={elapsed:.2f} output={out_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,23 @@
 from __future__ import annotations
 
 import argparse
+import concurrent.futures as cf
+import hashlib
 import json
-import re
+import os
 import time
+from collections import deque
+from itertools import islice
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from profiling import STAGES, add_profile_args, start_profiler
+from topic_classifier import CLASSIFIER_VERSION, TopicClassifier, words
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 
 PRINCIPLES = [
@@ -199,33 +212,131 @@ EXCEPTIONS = [
 ]
 
 
+class KeywordMatcher:
+    """Multi-pattern substring matcher compiled once over every rule keyword.
+
+    With pyahocorasick installed each document is scanned in a single pass
+    regardless of how many keywords exist; otherwise it falls back to one
+    substring check per keyword. Both report exactly the keywords for which
+    `kw in text` holds.
+    """
+
+    def __init__(self, keywords: list[str]) -> None:
+        self.keywords = keywords
+        self._automaton = None
+        if ahocorasick is not None and keywords:
+            automaton = ahocorasick.Automaton()
+            for idx, kw in enumerate(keywords):
+                automaton.add_word(kw, idx)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def find(self, text: str) -> set[int]:
+        if self._automaton is None:
+            return {idx for idx, kw in enumerate(self.keywords) if kw in text}
+        return {idx for _, idx in self._automaton.iter(text)}
+
+
+def _keyword_ids(groups: list[list[str]], index: dict[str, int]) -> list[list[int]]:
+    return [[index.setdefault(kw, len(index)) for kw in group] for group in groups]
+
+
+_KEYWORD_INDEX: dict[str, int] = {}
+RULE_KEYWORD_IDS = _keyword_ids([rule["keywords"] for rule in TOPIC_RULES], _KEYWORD_INDEX)
+EXCEPTION_KEYWORD_IDS = _keyword_ids([ex["keywords"] for ex in EXCEPTIONS], _KEYWORD_INDEX)
+MATCHER = KeywordMatcher(list(_KEYWORD_INDEX))
+
+
+# Bump whenever generate_draft's fixed wording or output shape changes.
+DRAFT_FORMAT_VERSION = 2
+
+
+def _fingerprint(value) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def rules_fingerprints() -> dict[str, str]:
+    """Per-topic fingerprint of everything a draft for that topic depends on.
+
+    Every keyword list is included because any of them can change which
+    topic or exception an entry lands on; a non-keyword edit to one topic's
+    rule or directives only invalidates drafts of that topic.
+    """
+    shared = {
+        "version": DRAFT_FORMAT_VERSION,
+        "keywords": [rule["keywords"] for rule in TOPIC_RULES],
+        "exceptions": EXCEPTIONS,
+        "principles": PRINCIPLES,
+    }
+    return {
+        rule["name"]: _fingerprint({**shared, "rule": rule, "directives": PROFILE_DIRECTIVES.get(rule["name"], [])})
+        for rule in TOPIC_RULES
+    }
+
+
+RULE_FINGERPRINTS = rules_fingerprints()
+TOPIC_INDEX = {rule["name"]: i for i, rule in enumerate(TOPIC_RULES)}
+
+
+def input_hash(entry: dict) -> str:
+    return _fingerprint(
+        [entry.get("url"), entry.get("title", ""), entry.get("question", ""), entry.get("raw_text", "")]
+    )
+
+
 def normalize(text: str) -> str:
-    return re.sub(r"\s+", " ", text or "").strip().lower()
+    # str.split() splits on exactly the characters `\s` matches, without the regex overhead.
+    return " ".join((text or "").split()).lower()
 
 
-def pick_topic(text: str) -> dict:
+def scan_keywords(text: str) -> tuple[list[int], list[int]]:
+    """One pass over `text`: per-rule keyword hit counts and indices of matched EXCEPTIONS."""
+    return keyword_hits(MATCHER.find(text))
+
+
+def keyword_hits(found: set[int]) -> tuple[list[int], list[int]]:
+    scores = [sum(1 for kid in ids if kid in found) for ids in RULE_KEYWORD_IDS]
+    exceptions = [i for i, ids in enumerate(EXCEPTION_KEYWORD_IDS) if any(kid in found for kid in ids)]
+    return scores, exceptions
+
+
+def best_rule(scores: list[int]) -> dict:
+    # First rule with the highest score wins, so ties go to the earlier rule.
     best = None
     best_score = -1
-    for rule in TOPIC_RULES:
-        score = sum(1 for kw in rule["keywords"] if kw in text)
+    for rule, score in zip(TOPIC_RULES, scores):
         if score > best_score:
             best = rule
             best_score = score
     return best or TOPIC_RULES[0]
 
 
-def find_exception_notes(text: str) -> tuple[list[str], list[str]]:
+def exception_notes(indices: list[int]) -> tuple[list[str], list[str]]:
     notes = []
     verses = []
-    for ex in EXCEPTIONS:
-        if any(kw in text for kw in ex["keywords"]):
-            notes.append(ex["note"])
-            verses.extend(ex["verses"])
+    for i in indices:
+        notes.append(EXCEPTIONS[i]["note"])
+        verses.extend(EXCEPTIONS[i]["verses"])
     return notes, verses
 
 
-def generate_draft(entry: dict) -> dict:
-    text = normalize(
+def keyword_confidence(scores: list[int]) -> float:
+    """Share of all keyword hits that went to the best rule; 0.0 for the no-match TOPIC_RULES[0] fallback."""
+    total = sum(scores)
+    return round(max(scores) / total, 4) if total else 0.0
+
+
+def pick_topic(text: str) -> dict:
+    return best_rule(scan_keywords(text)[0])
+
+
+def find_exception_notes(text: str) -> tuple[list[str], list[str]]:
+    return exception_notes(scan_keywords(text)[1])
+
+
+def entry_text(entry: dict) -> str:
+    return normalize(
         " ".join(
             [
                 entry.get("title", ""),
@@ -234,8 +345,24 @@ def generate_draft(entry: dict) -> dict:
             ]
         )
     )
-    topic = pick_topic(text)
-    extra_notes, extra_verses = find_exception_notes(text)
+
+
+def generate_draft(
+    entry: dict,
+    classified: Optional[tuple[int, float]] = None,
+    fingerprints: Optional[dict[str, str]] = None,
+    found: Optional[set[int]] = None,
+) -> dict:
+    """Draft one entry. `classified` is a (TOPIC_RULES index, confidence) pair that overrides keyword scoring.
+
+    `found` is the keyword ids of `entry_text(entry)` when the caller already matched them.
+    """
+    scores, exceptions = keyword_hits(MATCHER.find(entry_text(entry)) if found is None else found)
+    if classified is None:
+        topic, confidence = best_rule(scores), keyword_confidence(scores)
+    else:
+        topic, confidence = TOPIC_RULES[classified[0]], round(classified[1], 4)
+    extra_notes, extra_verses = exception_notes(exceptions)
     verses = sorted(set(topic["verses"] + extra_verses))
 
     question_summary = entry.get("question") or entry.get("title") or "No question text extracted."
@@ -262,37 +389,391 @@ def generate_draft(entry: dict) -> dict:
         "title": entry.get("title"),
         "question_summary": question_summary,
         "topic": topic["name"],
+        "topic_confidence": confidence,
         "neo_mutazili_principles": PRINCIPLES,
         "quran_references": verses,
         "draft_fatwa_text": " ".join(answer_lines),
         "generated_at_unix": int(time.time()),
+        "input_hash": input_hash(entry),
+        "rules_fingerprint": (fingerprints or RULE_FINGERPRINTS)[topic["name"]],
+    }
+
+
+def classifier_features(entry: dict) -> tuple[set[int], set[str]]:
+    """Keyword ids over the whole entry, words from the title and question only (raw_text repeats the answer)."""
+    return MATCHER.find(entry_text(entry)), words(f"{entry.get('title', '')} {entry.get('question', '')}".lower())
+
+
+def model_fingerprints(labels_digest: str) -> dict[str, str]:
+    """Per-topic fingerprints for drafts whose topic came from the model rather than keyword scoring.
+
+    The model is refit on every run, but only a change of rules, classifier
+    version or training labels invalidates carried drafts; pass --full to
+    reclassify everything against the current corpus.
+    """
+    return {
+        name: _fingerprint([fingerprint, CLASSIFIER_VERSION, labels_digest])
+        for name, fingerprint in RULE_FINGERPRINTS.items()
     }
 
 
+def train_classifier(
+    entries: Iterable[dict], labels: dict[str, str], label_weight: float
+) -> tuple[TopicClassifier, int, int]:
+    """Fit on explicit labels plus self-labelled entries; returns (model, labelled, self-labelled).
+
+    Entries whose keyword scoring has a single best rule train the model on
+    that rule, so words that co-occur with keywords carry over to entries that
+    match no keyword at all. Explicit labels override and count `label_weight` times.
+    """
+    counted = {"labelled": 0, "self": 0}
+
+    def docs() -> Iterator[tuple[set[int], set[str], int, float]]:
+        for entry in entries:
+            found, doc_words = classifier_features(entry)
+            label = labels.get(entry.get("url"))
+            if label is not None:
+                counted["labelled"] += 1
+                yield found, doc_words, TOPIC_INDEX[label], label_weight
+                continue
+            scores = [sum(1 for kid in ids if kid in found) for ids in RULE_KEYWORD_IDS]
+            best = max(scores)
+            if best and scores.count(best) == 1:
+                counted["self"] += 1
+                yield found, doc_words, scores.index(best), 1.0
+
+    model = TopicClassifier.fit(RULE_KEYWORD_IDS, len(_KEYWORD_INDEX), docs())
+    return model, counted["labelled"], counted["self"]
+
+
+def load_topic_labels(path: Path) -> dict[str, str]:
+    """url -> topic from reviewed rows (JSONL with "url" and "topic"); unknown topics are an error."""
+    labels = {}
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["topic"] not in TOPIC_INDEX:
+                    raise ValueError(f"unknown topic {row['topic']!r} for {row['url']} in {path}")
+                labels[row["url"]] = row["topic"]
+    return labels
+
+
+def generate_drafts(entries: list[dict], classifier: Optional[tuple[TopicClassifier, dict]] = None) -> list[dict]:
+    """Draft a batch; with a (model, fingerprints) `classifier` the whole batch is classified in one call.
+
+    Entries the model knows no feature of keep the keyword-scoring topic.
+    """
+    if classifier is None:
+        return [generate_draft(entry) for entry in entries]
+    model, fingerprints = classifier
+    with STAGES.time("classify"):
+        features = [classifier_features(entry) for entry in entries]
+        topics, confidence = model.predict(features)
+    return [
+        generate_draft(entry, (int(t), float(c)) if t >= 0 else None, fingerprints, found)
+        for entry, (found, _), t, c in zip(entries, features, topics, confidence)
+    ]
+
+
+def load_previous_drafts(path: Path, fingerprints: Optional[dict[str, str]] = None) -> dict[str, tuple[str, int]]:
+    """Map url -> (input_hash, byte offset) for prior drafts still valid under the current rules."""
+    fingerprints = fingerprints or RULE_FINGERPRINTS
+    index: dict[str, tuple[str, int]] = {}
+    if not path.exists():
+        return index
+    offset = 0
+    with path.open("rb") as f:
+        for line in f:
+            start = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                draft = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            fingerprint = fingerprints.get(draft.get("topic"))
+            if draft.get("url") and draft.get("input_hash") and draft.get("rules_fingerprint") == fingerprint:
+                index[draft["url"]] = (draft["input_hash"], start)
+    return index
+
+
+def load_duplicate_urls(path: Path) -> set[str]:
+    """URLs that a dedup_questions.py map marks as non-canonical cluster members."""
+    skip = set()
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["url"] != row["canonical_url"]:
+                    skip.add(row["url"])
+    return skip
+
+
+def draft_lines(
+    lines: list[bytes],
+    previous: Optional[dict[str, tuple[str, int]]] = None,
+    previous_file: Optional[BinaryIO] = None,
+    skip: Optional[set[str]] = None,
+    classifier: Optional[tuple[TopicClassifier, dict]] = None,
+) -> list[tuple[Optional[str], bool]]:
+    """Return (output line, carried) per input line, reusing prior drafts that are still valid.
+
+    The line is None for entries listed in `skip` (near-duplicates of another
+    entry). The entries left to draft are generated as one batch.
+    """
+    results: list[tuple[Optional[str], bool]] = []
+    fresh: list[tuple[int, dict]] = []
+    for line in lines:
+        entry = json.loads(line)
+        if skip and entry.get("url") in skip:
+            results.append((None, False))
+            continue
+        if previous:
+            hit = previous.get(entry.get("url"))
+            if hit and hit[0] == input_hash(entry):
+                previous_file.seek(hit[1])
+                carried = previous_file.readline().decode("utf-8").rstrip("\n")
+                results.append((carried + "\n", True))
+                continue
+        fresh.append((len(results), entry))
+        results.append((None, False))
+    for (i, _), draft in zip(fresh, generate_drafts([entry for _, entry in fresh], classifier)):
+        results[i] = (json.dumps(draft, ensure_ascii=False) + "\n", False)
+    return results
+
+
+_PREVIOUS: tuple[Optional[str], dict[str, tuple[str, int]]] = (None, {})
+_SKIP: set[str] = set()
+_CLASSIFIER: Optional[tuple[TopicClassifier, dict]] = None
+
+
+def _init_previous(
+    path: Optional[str],
+    index: dict[str, tuple[str, int]],
+    skip: set[str],
+    classifier: Optional[tuple[TopicClassifier, dict]] = None,
+) -> None:
+    global _PREVIOUS, _SKIP, _CLASSIFIER
+    _PREVIOUS = (path, index)
+    _SKIP = skip
+    _CLASSIFIER = classifier
+
+
+def iter_byte_ranges(path: Path, chunk_bytes: int) -> Iterator[tuple[int, int]]:
+    size = path.stat().st_size
+    for start in range(0, size, max(1, chunk_bytes)):
+        yield start, min(size, start + chunk_bytes)
+
+
+def generate_chunk(path: str, start: int, end: int) -> tuple[list[str], list[bool]]:
+    """Draft every line whose first byte falls in [start, end).
+
+    Returns the output lines and, per line, whether it was carried over from
+    the previous output registered by `_init_previous`. Skipped duplicates
+    produce no line.
+    """
+    previous_path, previous = _PREVIOUS
+    previous_file = open(previous_path, "rb") if previous_path and previous else None
+    inputs = []
+    lines = []
+    carried = []
+    try:
+        with open(path, "rb") as src:
+            if start:
+                # Step back one byte so a line beginning exactly at `start` is kept.
+                src.seek(start - 1)
+                src.readline()
+            while src.tell() < end:
+                line = src.readline()
+                if not line:
+                    break
+                if line.strip():
+                    inputs.append(line)
+        for out, reused in draft_lines(inputs, previous, previous_file, _SKIP, _CLASSIFIER):
+            if out is not None:
+                lines.append(out)
+                carried.append(reused)
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+    return lines, carried
+
+
+def generate_parallel(
+    in_path: Path,
+    workers: int,
+    chunk_bytes: int,
+    ordered: bool = True,
+    previous_path: Optional[Path] = None,
+    previous: Optional[dict[str, tuple[str, int]]] = None,
+    skip: Optional[set[str]] = None,
+    classifier: Optional[tuple[TopicClassifier, dict]] = None,
+) -> Iterator[tuple[list[str], list[bool]]]:
+    """Yield per-chunk (lines, carried flags) from a process pool, in input order unless `ordered` is False.
+
+    At most `workers * 2` chunks are in flight, so memory is bounded by chunk
+    size rather than corpus size.
+    """
+    pool = cf.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_previous,
+        initargs=(str(previous_path) if previous_path else None, previous or {}, skip or set(), classifier),
+    )
+    ranges = iter_byte_ranges(in_path, chunk_bytes)
+    window = workers * 2
+    try:
+        if ordered:
+            queue: deque[cf.Future] = deque()
+            for start, end in ranges:
+                queue.append(pool.submit(generate_chunk, str(in_path), start, end))
+                if len(queue) >= window:
+                    yield queue.popleft().result()
+            while queue:
+                yield queue.popleft().result()
+        else:
+            in_flight: set[cf.Future] = set()
+            for start, end in ranges:
+                in_flight.add(pool.submit(generate_chunk, str(in_path), start, end))
+                if len(in_flight) >= window:
+                    done, in_flight = cf.wait(in_flight, return_when=cf.FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+            for fut in cf.as_completed(in_flight):
+                yield fut.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate neo-Mutazili drafts from scraped entries")
     parser.add_argument("--input", required=True, help="Input JSONL of scraped IslamQA entries")
     parser.add_argument("--output", required=True, help="Output JSONL of draft fatawa")
     parser.add_argument("--limit", type=int, default=2000, help="Max rows to process")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (1 = inline)")
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=4.0,
+        help="Input byte-range size handed to each worker task",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="With --workers, write chunks as they finish instead of in input order",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Regenerate every draft instead of carrying forward unchanged ones",
+    )
+    parser.add_argument(
+        "--dedup-map",
+        help="dedup_questions.py output; entries that are not their cluster's canonical are skipped",
+    )
+    parser.add_argument(
+        "--classifier",
+        choices=["keywords", "model"],
+        default="keywords",
+        help="Topic assignment: per-entry keyword scoring, or a batch naive Bayes model fit on this input",
+    )
+    parser.add_argument(
+        "--train-labels",
+        help="With --classifier model: JSONL of reviewed {url, topic} rows used as training labels",
+    )
+    parser.add_argument("--label-weight", type=float, default=5.0, help="Weight of a reviewed label vs a keyword one")
+    parser.add_argument("--classify-batch", type=int, default=2048, help="Entries classified per model call")
+    add_profile_args(parser)
     args = parser.parse_args()
+    start_profiler(args)
 
     in_path = Path(args.input)
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    # The previous output is read while the new one is written, so swap at the end.
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    skip = load_duplicate_urls(Path(args.dedup_map)) if args.dedup_map else set()
+
+    classifier = None
+    fingerprints = RULE_FINGERPRINTS
+    if args.classifier == "model":
+        try:
+            labels = load_topic_labels(Path(args.train_labels)) if args.train_labels else {}
+        except ValueError as exc:
+            parser.error(str(exc))
+        fingerprints = model_fingerprints(_fingerprint(sorted(labels.items())))
+        with STAGES.time("train"), in_path.open("rb") as src:
+            entries = (json.loads(line) for line in src if line.strip())
+            model, labelled, self_labelled = train_classifier(
+                (e for e in entries if e.get("url") not in skip), labels, args.label_weight
+            )
+        classifier = (model, fingerprints)
+        print(
+            f"classifier labelled={labelled} self_labelled={self_labelled} "
+            f"vocab={len(model.vocab)} topics={len(TOPIC_RULES)}"
+        )
+    with STAGES.time("load_previous"):
+        previous = {} if args.full else load_previous_drafts(out_path, fingerprints)
 
     rows = 0
-    with in_path.open("r", encoding="utf-8") as src, out_path.open("w", encoding="utf-8") as dst:
-        for line in src:
-            if not line.strip():
-                continue
-            entry = json.loads(line)
-            draft = generate_draft(entry)
-            dst.write(json.dumps(draft, ensure_ascii=False) + "\n")
-            rows += 1
-            if rows >= args.limit:
-                break
-
-    print(f"done generated={rows} output={out_path}")
+    carried = 0
+    if args.workers > 1:
+        chunk_bytes = max(1, int(args.chunk_mb * 1024 * 1024))
+        with tmp_path.open("w", encoding="utf-8") as dst:
+            # Workers run in other processes, so "generate" is the time spent waiting for each chunk.
+            waiting_since = time.perf_counter()
+            for lines, reused in generate_parallel(
+                in_path,
+                args.workers,
+                chunk_bytes,
+                ordered=not args.unordered,
+                previous_path=out_path,
+                previous=previous,
+                skip=skip,
+                classifier=classifier,
+            ):
+                STAGES.add("generate", time.perf_counter() - waiting_since, len(lines))
+                lines = lines[: args.limit - rows]
+                with STAGES.time("write"):
+                    dst.writelines(lines)
+                rows += len(lines)
+                carried += sum(reused[: len(lines)])
+                if rows >= args.limit:
+                    break
+                waiting_since = time.perf_counter()
+    else:
+        previous_file = out_path.open("rb") if previous else None
+        try:
+            with in_path.open("rb") as src, tmp_path.open("w", encoding="utf-8") as dst:
+                # Batches only matter to the model; keyword scoring is per entry either way.
+                batch_size = args.classify_batch if classifier else 1
+                lines = (line for line in src if line.strip())
+                while rows < args.limit:
+                    batch = list(islice(lines, max(1, batch_size)))
+                    if not batch:
+                        break
+                    started = time.perf_counter()
+                    results = draft_lines(batch, previous, previous_file, skip, classifier)
+                    STAGES.add("generate", time.perf_counter() - started, len(batch))
+                    for out, reused in results:
+                        if out is None:
+                            continue
+                        dst.write(out)
+                        rows += 1
+                        carried += reused
+                        if rows >= args.limit:
+                            break
+        finally:
+            if previous_file is not None:
+                previous_file.close()
+    os.replace(tmp_path, out_path)
+
+    STAGES.print_report()
+    print(
+        f"done generated={rows} regenerated={rows - carried} carried={carried} "
+        f"duplicates_known={len(skip)} output={out_path}"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""Content-addressed archive of raw HTML responses in zstd segment files."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+DDL = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    fetched_at_unix INTEGER NOT NULL
+);
+"""
+
+
+def segment_path(root: Path, segment: int) -> Path:
+    return root / f"segment-{segment:05d}.zst"
+
+
+class HtmlArchive:
+    """Append-only store of raw responses keyed by sha256 of the body.
+
+    Each body is an independent zstd frame inside a numbered segment file, so
+    any record can be read with one seek. `index.sqlite3` maps digests to
+    (segment, offset, length) and URLs to their latest digest. Identical bodies
+    are stored once. Call `flush` before treating archived records as durable.
+    """
+
+    def __init__(self, root: Path, segment_bytes: int = 256 * 1024 * 1024, level: int = 9) -> None:
+        import zstandard
+
+        root.mkdir(parents=True, exist_ok=True)
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(root / "index.sqlite3", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(DDL)
+        last = self._conn.execute("SELECT MAX(segment) FROM blobs").fetchone()[0]
+        self._segment = last or 0
+        self._out = segment_path(root, self._segment).open("ab")
+
+    def put(self, url: str, html: str, fetched_at_unix: int) -> str:
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = self._conn.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if not known:
+                frame = self._compressor.compress(data)
+                if self._out.tell() and self._out.tell() + len(frame) > self.segment_bytes:
+                    # The index rows still uncommitted may point into this segment.
+                    self._out.flush()
+                    os.fsync(self._out.fileno())
+                    self._out.close()
+                    self._segment += 1
+                    self._out = segment_path(self.root, self._segment).open("ab")
+                offset = self._out.tell()
+                self._out.write(frame)
+                self._conn.execute(
+                    "INSERT INTO blobs (digest, segment, offset, length, raw_length) VALUES (?, ?, ?, ?, ?)",
+                    (digest, self._segment, offset, len(frame), len(data)),
+                )
+            self._conn.execute(
+                """
+                INSERT INTO urls (url, digest, fetched_at_unix) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    digest=excluded.digest,
+                    fetched_at_unix=excluded.fetched_at_unix
+                """,
+                (url, digest, fetched_at_unix),
+            )
+        return digest
+
+    def iter_records(self) -> Iterator[tuple[str, int, int, int, int]]:
+        """Yield (url, fetched_at_unix, segment, offset, length) in on-disk order."""
+        yield from self._conn.execute(
+            """
+            SELECT u.url, u.fetched_at_unix, b.segment, b.offset, b.length
+            FROM urls u JOIN blobs b ON b.digest = u.digest
+            ORDER BY b.segment, b.offset, u.url
+            """
+        )
+
+    def flush(self) -> None:
+        """Make the segment bytes durable, then commit the index rows that point at them."""
+        with self._lock:
+            self._out.flush()
+            os.fsync(self._out.fileno())
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._out.flush()
+            os.fsync(self._out.fileno())
+            self._out.close()
+            self._conn.commit()
+            self._conn.close()
+
+
+class ArchiveReader:
+    """Read-only access to archived bodies; cheap to create in worker processes."""
+
+    def __init__(self, root: Path) -> None:
+        import zstandard
+
+        self.root = root
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._files: dict[int, BinaryIO] = {}
+
+    def read(self, segment: int, offset: int, length: int) -> str:
+        f = self._files.get(segment)
+        if f is None:
+            f = self._files[segment] = segment_path(self.root, segment).open("rb")
+        f.seek(offset)
+        return self._decompressor.decompress(f.read(length)).decode("utf-8")
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
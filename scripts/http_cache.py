@@ -0,0 +1,145 @@
+"""On-disk HTTP response cache with conditional-GET validators."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+
+DDL = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    derived BLOB,
+    size INTEGER NOT NULL,
+    stored_at_unix INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+"""
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(self.body).decode("utf-8")
+
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """URL-keyed response store, evicting least recently used entries past `max_bytes`.
+
+    Bodies are zlib-compressed. Each entry may also carry a `derived` payload
+    (e.g. the parsed sitemap locs) that is dropped whenever the body changes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(DDL)
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        with self._conn:
+            self._evict()
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return CachedResponse(url=url, etag=row[0], last_modified=row[1], body=row[2])
+
+    def store(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        if not etag and not last_modified:
+            return
+        body = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT INTO responses (url, etag, last_modified, body, derived, size, stored_at_unix, accessed_at)
+                VALUES (?, ?, ?, ?, NULL, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag=excluded.etag,
+                    last_modified=excluded.last_modified,
+                    body=excluded.body,
+                    derived=NULL,
+                    size=excluded.size,
+                    stored_at_unix=excluded.stored_at_unix,
+                    accessed_at=excluded.accessed_at
+                """,
+                (url, etag, last_modified, body, len(body), int(now), now),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            self._evict()
+
+    def touch(self, url: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+
+    def load_derived(self, url: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT derived FROM responses WHERE url = ?", (url,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def store_derived(self, url: str, value: Any) -> None:
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT length(body), length(derived) FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if not row:
+                return
+            self._conn.execute(
+                "UPDATE responses SET derived = ?, size = ? WHERE url = ?",
+                (blob, row[0] + len(blob), url),
+            )
+            self._total += len(blob) - (row[1] or 0)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not victims:
+                self._total = 0
+                return
+            for url, size in victims:
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    return
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
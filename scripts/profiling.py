@@ -0,0 +1,149 @@
+"""Per-stage wall-time accounting and opt-in cProfile / sampling profiling for the pipeline scripts."""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class StageTimer:
+    """Thread-safe totals of (calls, seconds, max seconds) per named stage.
+
+    Stages timed in several threads at once sum their seconds, so a stage can
+    report more seconds than the run's wall time; compare `mean_ms` instead.
+    """
+
+    def __init__(self) -> None:
+        self._stages: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = self._stages[stage] = [0, 0.0, 0.0]
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def report(self) -> list[str]:
+        """One `timing=<stage> calls= seconds= mean_ms= max_ms=` line per stage, in first-seen order."""
+        with self._lock:
+            stages = [(name, *totals) for name, totals in self._stages.items()]
+        return [
+            f"timing={name} calls={int(calls)} seconds={seconds:.3f} "
+            f"mean_ms={seconds / calls * 1000 if calls else 0:.3f} max_ms={longest * 1000:.3f}"
+            for name, calls, seconds, longest in stages
+        ]
+
+    def print_report(self) -> None:
+        for line in self.report():
+            print(line)
+
+
+# Shared by every pipeline module, so the in-process streaming pipeline reports all stages together.
+STAGES = StageTimer()
+
+
+class StackSampler(threading.Thread):
+    """Sample every thread's Python stack at a fixed interval, collapsed as "outer;...;inner" -> count.
+
+    Unlike cProfile, which only sees the thread that enabled it, this covers
+    thread-pool workers too. Work in child processes is not seen by either.
+    """
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def top_functions(self, n: int) -> list[tuple[str, int]]:
+        """Innermost frames by sample count ("self" time)."""
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "sample"],
+        help="Profile this run: cProfile (main thread, exact calls) or a stack sampler (all threads)",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="",
+        help="cprofile: pstats file for snakeviz/pstats; sample: collapsed stacks for flamegraph tools",
+    )
+    parser.add_argument("--profile-interval-ms", type=float, default=5.0, help="Stack sampler interval")
+
+
+def start_profiler(args: argparse.Namespace) -> None:
+    """Start the profiler chosen by `add_profile_args` flags; its summary is written to stderr at exit."""
+    mode: Optional[str] = args.profile
+    output = args.profile_output
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+
+        def finish() -> None:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+
+        profiler.enable()
+        atexit.register(finish)
+    elif mode == "sample":
+        sampler = StackSampler(args.profile_interval_ms / 1000.0)
+
+        def finish() -> None:
+            sampler.stop()
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    for stack, count in sampler.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+            total = max(1, sum(sampler.stacks.values()))
+            print(f"profile samples={sampler.samples} interval_ms={args.profile_interval_ms}", file=sys.stderr)
+            for name, count in sampler.top_functions(25):
+                print(f"profile self_pct={count / total * 100:.1f} samples={count} frame={name}", file=sys.stderr)
+
+        sampler.start()
+        atexit.register(finish)
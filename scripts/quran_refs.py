@@ -0,0 +1,20 @@
+"""Parsing of "surah:ayah[-ayah]" Quran references shared by the builder and the API."""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+_REF_RE = re.compile(r"^\s*(\d{1,3})\s*:\s*(\d{1,3})(?:\s*[-–—]\s*(\d{1,3}))?\s*$")
+
+
+def parse_verse_ref(ref: str) -> Optional[tuple[int, int, int]]:
+    """Return (surah, ayah_start, ayah_end) for "2:275" or "2:183-185"; None if malformed."""
+    m = _REF_RE.match(ref or "")
+    if not m:
+        return None
+    surah, start = int(m.group(1)), int(m.group(2))
+    end = int(m.group(3)) if m.group(3) else start
+    if not (1 <= surah <= 114) or start < 1 or end < start:
+        return None
+    return surah, start, end
@@ -0,0 +1,209 @@
+"""TF-IDF nearest neighbours over fatwa titles and question summaries, precomputed into fatwa_neighbors."""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Iterable
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from profiling import STAGES
+from search_text import fold
+
+_WORD_RE = re.compile(r"\w{2,}")
+
+# Terms in more than this share of documents carry almost no signal but make
+# the block products dense, so they are dropped like stop words.
+MAX_DF = 0.5
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD_RE.findall(fold(text).lower())
+
+
+def tfidf_matrix(docs: Iterable[str], max_df: float = MAX_DF) -> csr_matrix:
+    """L2-normalised sublinear-tf * smooth-idf rows, one per document.
+
+    Terms seen in a single document cannot link two documents and are dropped.
+    """
+    vocab: dict[str, int] = {}
+    indptr = [0]
+    indices: list[int] = []
+    counts: list[int] = []
+    for doc in docs:
+        tf: dict[int, int] = {}
+        for token in tokenize(doc):
+            term = vocab.setdefault(token, len(vocab))
+            tf[term] = tf.get(term, 0) + 1
+        indices.extend(tf)
+        counts.extend(tf.values())
+        indptr.append(len(indices))
+    n = len(indptr) - 1
+    x = csr_matrix(
+        (np.asarray(counts, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(n, len(vocab)),
+    )
+    df = np.bincount(x.indices, minlength=x.shape[1])
+    keep = np.flatnonzero((df >= 2) & (df <= max(2, max_df * n)))
+    x = x[:, keep].tocsr()
+    idf = (np.log((1 + n) / (1 + df[keep])) + 1).astype(np.float32)
+    x.data = (1 + np.log(x.data)) * idf[x.indices]
+    norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    x.data /= np.repeat(norms, np.diff(x.indptr)).astype(np.float32)
+    return x
+
+
+def top_k_neighbors(
+    x: csr_matrix, k: int, block_mb: int, candidates: np.ndarray | None = None, rows: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return (neighbour row indices, cosine scores), each shaped (len(rows), k), best first.
+
+    `rows` are the query row indices (default: all). Similarities are computed
+    as dense (block rows x n) products so top-k is one argpartition per block;
+    block height keeps that under `block_mb`. Rows outside `candidates` (a bool
+    mask) and the row itself are never returned; missing neighbours have index
+    -1 and score 0.
+    """
+    n = x.shape[0]
+    rows = np.arange(n) if rows is None else rows
+    k = min(k, max(n - 1, 0))
+    out_idx = np.full((len(rows), k), -1, dtype=np.int64)
+    out_score = np.zeros((len(rows), k), dtype=np.float32)
+    if k == 0:
+        return out_idx, out_score
+    xt = x.T.tocsr()
+    excluded = ~candidates if candidates is not None else None
+    block = max(1, (block_mb << 20) // (4 * n))
+    for start in range(0, len(rows), block):
+        stop = min(start + block, len(rows))
+        query = rows[start:stop]
+        with STAGES.time("related_matmul"):
+            sims = (x[query] @ xt).toarray()
+        sims[np.arange(len(query)), query] = -1
+        if excluded is not None:
+            sims[:, excluded] = -1
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        top, scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(scores, order, axis=1)
+        found = scores > 0
+        out_idx[start:stop] = np.where(found, top, -1)
+        out_score[start:stop] = np.where(found, scores, 0)
+    return out_idx, out_score
+
+
+def _id_array(conn: sqlite3.Connection, sql: str) -> np.ndarray:
+    return np.fromiter((r[0] for r in conn.execute(sql)), dtype=np.int64)
+
+
+def _load_corpus(conn: sqlite3.Connection) -> tuple[np.ndarray, np.ndarray, csr_matrix]:
+    """(ids, canonical mask, tf-idf rows) for every fatwa, in id order."""
+    rows = conn.execute("SELECT id, title, question_summary, canonical_url FROM fatawa ORDER BY id").fetchall()
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    canonical = np.fromiter((r[3] is None for r in rows), dtype=bool, count=len(rows))
+    return ids, canonical, tfidf_matrix(f"{r[1] or ''} {r[2] or ''}" for r in rows)
+
+
+def _store_neighbors(
+    conn: sqlite3.Connection, ids: np.ndarray, rows: np.ndarray, idx: np.ndarray, scores: np.ndarray
+) -> int:
+    """Replace the stored lists of fatawa `ids[rows]` with top_k_neighbors output for those rows."""
+    src, rank = np.nonzero(idx >= 0)
+    scores = np.round(scores[src, rank].astype(np.float64), 4)
+    values = zip(ids[rows[src]].tolist(), (rank + 1).tolist(), ids[idx[src, rank]].tolist(), scores.tolist())
+    conn.executemany("DELETE FROM fatwa_neighbors WHERE fatwa_id = ?", ((i,) for i in ids[rows].tolist()))
+    conn.executemany("INSERT INTO fatwa_neighbors (fatwa_id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)", values)
+    return len(src)
+
+
+def rebuild_neighbors(conn: sqlite3.Connection, k: int, block_mb: int) -> int:
+    """Recompute fatwa_neighbors for the whole table in one transaction; returns rows written.
+
+    Near-duplicate rows (canonical_url set) are still given neighbours but are
+    never offered as one, so a question's republished copies do not crowd out
+    related questions.
+    """
+    with STAGES.time("related_tfidf"):
+        ids, canonical, x = _load_corpus(conn)
+    idx, scores = top_k_neighbors(x, k, block_mb, canonical)
+    with conn, STAGES.time("related_store"):
+        conn.execute("DELETE FROM fatwa_neighbors")
+        conn.execute("DELETE FROM fatwa_neighbors_dirty")
+        return _store_neighbors(conn, ids, np.arange(len(ids)), idx, scores)
+
+
+def update_neighbors(conn: sqlite3.Connection, k: int, block_mb: int) -> tuple[int, int]:
+    """Recompute fatwa_neighbors only where rows in fatwa_neighbors_dirty can change it.
+
+    Affected rows are:
+    - the dirty rows themselves;
+    - rows whose stored list references a dirty row;
+    - rows a dirty canonical row now beats (its score exceeds their k-th stored
+      score, or they have fewer than k neighbours).
+    Only those rows get a top-k pass, so the quadratic work follows the size of
+    the change. The tf-idf matrix is still rebuilt, a linear pass, and rows not
+    recomputed keep scores from the IDF of their last refresh.
+    Returns (affected rows, neighbour rows written).
+    """
+    dirty_ids = _id_array(conn, "SELECT fatwa_id FROM fatwa_neighbors_dirty")
+    if not len(dirty_ids):
+        return 0, 0
+    with STAGES.time("related_tfidf"):
+        ids, canonical, x = _load_corpus(conn)
+
+    def positions(wanted: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Row index of each id in `wanted`, and whether it is still in fatawa."""
+        pos = np.minimum(np.searchsorted(ids, wanted), max(len(ids) - 1, 0))
+        return pos, (ids[pos] == wanted) if len(ids) else np.zeros(len(wanted), dtype=bool)
+
+    pos, found = positions(dirty_ids)
+    dirty = pos[found]
+    affected = np.zeros(len(ids), dtype=bool)
+    affected[dirty] = True
+    pos, found = positions(
+        _id_array(
+            conn,
+            """
+            SELECT DISTINCT n.fatwa_id FROM fatwa_neighbors n
+            JOIN fatwa_neighbors_dirty d ON d.fatwa_id = n.neighbor_id
+            """,
+        )
+    )
+    affected[pos[found]] = True
+
+    # Score a row must beat to enter each row's list; 0 while the list has room.
+    threshold = np.zeros(len(ids), dtype=np.float32)
+    lists = np.array(
+        conn.execute("SELECT fatwa_id, COUNT(*), MIN(score) FROM fatwa_neighbors GROUP BY fatwa_id").fetchall(),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    pos, found = positions(lists[:, 0].astype(np.int64))
+    full = found & (lists[:, 1] >= k)
+    threshold[pos[full]] = lists[full, 2]
+    offered = dirty[canonical[dirty]]
+    if len(offered):
+        xt = x.T.tocsr()
+        block = max(1, (block_mb << 20) // (4 * len(ids)))
+        for start in range(0, len(offered), block):
+            query = offered[start : start + block]
+            with STAGES.time("related_matmul"):
+                sims = (x[query] @ xt).toarray()
+            sims[np.arange(len(query)), query] = 0
+            affected |= (sims > threshold).any(axis=0)
+
+    rows = np.flatnonzero(affected)
+    idx, scores = top_k_neighbors(x, k, block_mb, canonical, rows)
+    with conn, STAGES.time("related_store"):
+        written = _store_neighbors(conn, ids, rows, idx, scores)
+        conn.execute("DELETE FROM fatwa_neighbors_dirty")
+    return len(rows), written
+
+
+def neighbors_missing(conn: sqlite3.Connection) -> bool:
+    """True when fatawa has rows but fatwa_neighbors was never filled (e.g. a DB built before it existed)."""
+    if conn.execute("SELECT 1 FROM fatwa_neighbors LIMIT 1").fetchone():
+        return False
+    return conn.execute("SELECT 1 FROM fatawa LIMIT 1").fetchone() is not None
@@ -1,12 +1,36 @@
 #!/usr/bin/env python3
-"""Run scrape + draft generation pipeline."""
+"""Run scrape + draft generation + DB build pipeline."""
 
 from __future__ import annotations
 
 import argparse
+import concurrent.futures as cf
+import json
+import queue
+import sqlite3
 import subprocess
 import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
+from typing import Any, Callable, Optional
+
+import requests
+
+from build_sqlite_db import build_row, load_canonical_map, open_db, refresh_neighbors, sync_rows
+from crawl_state import CrawlState
+from generate_mutazili_fatawa import generate_draft
+from profiling import STAGES, add_profile_args, start_profiler
+from scrape_islamqa_org import (
+    EXTRACTORS,
+    SITEMAP_INDEX,
+    CheckpointWriter,
+    iter_candidates,
+    repair_jsonl_tail,
+    scrape_threaded,
+)
 
 
 def run(cmd: list[str]) -> None:
@@ -14,6 +38,271 @@ def run(cmd: list[str]) -> None:
     subprocess.run(cmd, check=True)
 
 
+@dataclass
+class Batch:
+    """One scrape checkpoint's records moving downstream; `done` is set once they are in the DB."""
+
+    payload: Any
+    records: int
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    batches: int = 0
+    records: int = 0
+    busy: float = 0.0
+    waiting: float = 0.0
+    blocked: float = 0.0
+    max_depth: int = 0
+
+    def line(self, elapsed: float) -> str:
+        return (
+            f"stage={self.name} batches={self.batches} records={self.records} "
+            f"records_per_sec={self.records / elapsed:.0f} busy_seconds={self.busy:.2f} "
+            f"wait_seconds={self.waiting:.2f} blocked_seconds={self.blocked:.2f} max_queue={self.max_depth}"
+        )
+
+
+def put(q: queue.Queue, item: Optional[Batch], stats: StageStats) -> None:
+    """Put with the time spent waiting on a full queue charged to `stats.blocked` (backpressure)."""
+    started = time.perf_counter()
+    q.put(item)
+    stats.blocked += time.perf_counter() - started
+
+
+class Stage(threading.Thread):
+    """Apply `fn` to each batch from `inbox` and pass the result on; None ends the stream.
+
+    After a failure the stage keeps draining its inbox, failing every batch,
+    so the upstream producer is never left blocked on a full queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        fn: Callable[[Any], Any],
+        close: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.fn = fn
+        self.close = close
+        self.stats = StageStats(name)
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        stats = self.stats
+        try:
+            while True:
+                stats.max_depth = max(stats.max_depth, self.inbox.qsize())
+                started = time.perf_counter()
+                batch = self.inbox.get()
+                stats.waiting += time.perf_counter() - started
+                if batch is None:
+                    break
+                if self.error is None:
+                    started = time.perf_counter()
+                    try:
+                        batch.payload = self.fn(batch.payload)
+                    except Exception as exc:
+                        self.error = exc
+                    stats.busy += time.perf_counter() - started
+                if self.error is not None:
+                    batch.error = self.error
+                    batch.done.set()
+                    continue
+                stats.batches += 1
+                stats.records += batch.records
+                if self.outbox is None:
+                    batch.done.set()
+                else:
+                    put(self.outbox, batch, stats)
+        finally:
+            if self.outbox is not None:
+                self.outbox.put(None)
+            if self.close is not None:
+                self.close()
+
+
+class StreamCheckpointWriter(CheckpointWriter):
+    """Checkpoint writer that hands scraped lines to the generate stage instead of a file.
+
+    Crawl state is committed only after every batch delivered since the last
+    checkpoint has been acknowledged by the DB stage, so a killed run still
+    never marks work done that did not reach the database.
+    """
+
+    def __init__(
+        self, out, state: CrawlState, limit: int, outbox: queue.Queue, checkpoint_every: int, **kwargs
+    ) -> None:
+        super().__init__(out, state, limit, **kwargs)
+        self.outbox = outbox
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.pending: list[Batch] = []
+        self.stats = StageStats("scrape")
+
+    def deliver(self, lines: list[str]) -> None:
+        if self.out is not None:
+            self.out.write("".join(lines))
+            self.out.flush()
+        batch = Batch(list(lines), len(lines))
+        self.stats.batches += 1
+        self.stats.records += len(lines)
+        self.stats.max_depth = max(self.stats.max_depth, self.outbox.qsize())
+        put(self.outbox, batch, self.stats)
+        self.pending.append(batch)
+
+    def commit(self, wait: bool = False) -> None:
+        if self.archive is not None:
+            self.archive.flush()
+        if self.lines:
+            self.deliver(self.lines)
+            self.lines.clear()
+        if wait or len(self.pending) >= self.checkpoint_every:
+            started = time.perf_counter()
+            for batch in self.pending:
+                batch.done.wait()
+            self.stats.waiting += time.perf_counter() - started
+            failed = next((b.error for b in self.pending if b.error is not None), None)
+            self.pending.clear()
+            if failed is not None:
+                self.state.rollback()
+                raise RuntimeError("pipeline stage failed; crawl state not committed") from failed
+            self.state.flush()
+
+
+def generate_lines(lines: list[str], drafts_out=None) -> list[tuple[dict, dict]]:
+    pairs = []
+    with STAGES.time("generate"):
+        for line in lines:
+            entry = json.loads(line)
+            pairs.append((generate_draft(entry), entry))
+    if drafts_out is not None:
+        drafts_out.write("".join(json.dumps(d, ensure_ascii=False) + "\n" for d, _ in pairs))
+        drafts_out.flush()
+    return pairs
+
+
+class DbSink:
+    """Upsert (draft, scraped entry) pairs; the connection lives on the DB stage's thread."""
+
+    def __init__(self, path: Path, batch_size: int, canonical: Optional[dict[str, str]] = None) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        # Same url -> canonical_url map the batch build gets from --dedup-map, so rewritten rows keep their mark.
+        self.canonical = canonical or {}
+        self.conn: Optional[sqlite3.Connection] = None
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    def __call__(self, pairs: list[tuple[dict, dict]]) -> None:
+        if self.conn is None:
+            self.conn = open_db(self.path, self.batch_size)
+        now = int(time.time())
+        rows = [
+            build_row(draft, src, now, self.canonical.get(draft["url"])) for draft, src in pairs if draft.get("url")
+        ]
+        sync_rows(self.conn, rows, self.stats)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+
+
+def streaming_state_path(args: argparse.Namespace, root: Path, scraped: Path) -> Path:
+    """Crawl state for --streaming; shared with the batch scraper only when --tee keeps its JSONL complete.
+
+    The scraper's `<output>.state.sqlite3` marks URLs done on the promise that
+    they are in the JSONL. Without --tee they are not, so a later batch run
+    would skip them and a --delete-missing build would drop them from the DB.
+    """
+    shared = scraped.with_suffix(".state.sqlite3")
+    path = Path(args.state) if args.state else shared if args.tee else root / "streaming.state.sqlite3"
+    if not args.tee and path.resolve() == shared.resolve():
+        raise ValueError(f"--state {path} is the batch scraper's crawl state; it needs --tee")
+    return path
+
+
+def run_streaming(
+    args: argparse.Namespace, scraped: Path, drafts: Path, db: Path, dedup_map: Optional[Path], state_path: Path
+) -> None:
+    """Scrape, generate and upsert in one process, connected by bounded queues."""
+    to_generate: queue.Queue = queue.Queue(maxsize=args.queue_size)
+    to_db: queue.Queue = queue.Queue(maxsize=args.queue_size)
+    if args.tee:
+        repair_jsonl_tail(scraped)
+    tee_scraped = scraped.open("a", encoding="utf-8") if args.tee else None
+    tee_drafts = drafts.open("a", encoding="utf-8") if args.tee else None
+    sink = DbSink(db, args.batch_size, load_canonical_map(dedup_map) if dedup_map else None)
+    stages = [
+        Stage("generate", to_generate, to_db, lambda lines: generate_lines(lines, tee_drafts)),
+        Stage("db", to_db, None, sink, close=sink.close),
+    ]
+    for stage in stages:
+        stage.start()
+
+    session = requests.Session()
+    state = CrawlState(state_path)
+    writer = StreamCheckpointWriter(
+        tee_scraped, state, args.limit, to_generate, args.checkpoint_every, batch_size=args.batch_size
+    )
+    # Extraction in worker processes keeps the GIL free for the generate and DB stages.
+    parse_pool = cf.ProcessPoolExecutor(max_workers=args.parse_procs) if args.parse_procs > 0 else None
+    candidates = islice(iter_candidates(session, state, args.sitemap_index, None, args.resume), args.limit * 2)
+    started = time.perf_counter()
+    try:
+        scrape_busy = time.perf_counter()
+        try:
+            scrape_threaded(
+                candidates,
+                writer,
+                args.limit,
+                workers=max(1, args.workers),
+                session=session,
+                extractor=args.extractor,
+                parse_pool=parse_pool,
+            )
+        finally:
+            writer.stats.busy = time.perf_counter() - scrape_busy - writer.stats.blocked - writer.stats.waiting
+            try:
+                writer.commit(wait=True)
+            finally:
+                to_generate.put(None)
+                for stage in stages:
+                    stage.join()
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+        counts = state.queue_counts()
+        state.close()
+        for f in (tee_scraped, tee_drafts):
+            if f is not None:
+                f.close()
+
+    # Rows synced by every batch are marked in fatwa_neighbors_dirty and refreshed once at the end.
+    conn = open_db(db, args.batch_size)
+    try:
+        related = refresh_neighbors(conn, args.related_k, args.related_block_mb)
+    finally:
+        conn.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    for stats in [writer.stats] + [stage.stats for stage in stages]:
+        print(stats.line(elapsed))
+    STAGES.print_report()
+    print(
+        f"pipeline complete mode=streaming scraped={writer.written} failed={writer.failed} "
+        f"pending={counts.get('pending', 0)} inserted={sink.stats['inserted']} updated={sink.stats['updated']} "
+        f"unchanged={sink.stats['unchanged']} related={related} seconds={elapsed:.2f} db={db}"
+        + (f" tee_scraped={scraped} tee_drafts={drafts}" if args.tee else "")
+    )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run QuranQA initial data pipeline")
     parser.add_argument("--limit", type=int, default=2000, help="How many queries to scrape/generate")
@@ -23,6 +312,49 @@ def main() -> None:
         default=r"D:\IslamQAScraping",
         help="Root directory for scraped + generated outputs",
     )
+    parser.add_argument("--db", default="", help="SQLite DB to build (default: <storage-root>/quranqa.sqlite3)")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Scrape, generate and upsert concurrently in one process instead of file-by-file",
+    )
+    parser.add_argument(
+        "--dedup-map",
+        default="",
+        help="dedup_questions.py output marking near-duplicate rows in the DB "
+        "(default: <storage-root>/dedup_map.jsonl when it exists)",
+    )
+    parser.add_argument("--tee", action="store_true", help="Streaming: also append scraped/draft JSONL files")
+    parser.add_argument("--sitemap-index", default=SITEMAP_INDEX, help="Streaming: sitemap index URL")
+    parser.add_argument(
+        "--state",
+        default="",
+        help="Streaming: crawl-state path (default: the scraper's, next to the JSONL, with --tee; "
+        "<storage-root>/streaming.state.sqlite3 without)",
+    )
+    parser.add_argument("--resume", action="store_true", help="Streaming: finish the pending crawl queue first")
+    parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default="bs4", help="Streaming: HTML extractor")
+    parser.add_argument("--parse-procs", type=int, default=0, help="Streaming: extraction process pool size")
+    parser.add_argument("--batch-size", type=int, default=100, help="Streaming: records per queued batch")
+    parser.add_argument("--queue-size", type=int, default=8, help="Streaming: max batches waiting between stages")
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=8,
+        help="Streaming: batches between crawl-state commits (each waits for the DB to catch up)",
+    )
+    parser.add_argument(
+        "--classifier",
+        choices=["keywords", "model"],
+        default="keywords",
+        help="Batch: topic assignment for generate_mutazili_fatawa.py (streaming always uses keywords)",
+    )
+    parser.add_argument("--train-labels", default="", help="Batch: reviewed {url, topic} JSONL for --classifier model")
+    parser.add_argument("--related-k", type=int, default=10, help="TF-IDF neighbours stored per fatwa (0 = skip)")
+    parser.add_argument(
+        "--related-block-mb", type=int, default=256, help="Memory cap for each dense similarity block"
+    )
+    add_profile_args(parser)
     args = parser.parse_args()
 
     root = Path(args.storage_root)
@@ -30,6 +362,30 @@ def main() -> None:
 
     scraped = root / "islamqa_org_queries.jsonl"
     drafts = root / "mutazili_drafts.jsonl"
+    db = Path(args.db) if args.db else root / "quranqa.sqlite3"
+    dedup_map = Path(args.dedup_map) if args.dedup_map else root / "dedup_map.jsonl"
+    if not dedup_map.exists():
+        if args.dedup_map:
+            parser.error(f"--dedup-map not found: {dedup_map}")
+        dedup_map = None
+
+    if args.streaming:
+        start_profiler(args)
+        try:
+            state_path = streaming_state_path(args, root, scraped)
+        except ValueError as exc:
+            parser.error(str(exc))
+        run_streaming(args, scraped, drafts, db, dedup_map, state_path)
+        return
+
+    def profile_args(step: str) -> list[str]:
+        """Forward --profile to each step; outputs get a per-step suffix."""
+        if not args.profile:
+            return []
+        forwarded = ["--profile", args.profile, "--profile-interval-ms", str(args.profile_interval_ms)]
+        if args.profile_output:
+            forwarded += ["--profile-output", f"{args.profile_output}.{step}"]
+        return forwarded
 
     run(
         [
@@ -41,6 +397,7 @@ def main() -> None:
             str(args.limit),
             "--workers",
             str(args.workers),
+            *profile_args("scrape"),
         ]
     )
     run(
@@ -53,9 +410,31 @@ def main() -> None:
             str(drafts),
             "--limit",
             str(args.limit),
+            "--classifier",
+            args.classifier,
+            *(["--train-labels", args.train_labels] if args.train_labels else []),
+            *profile_args("generate"),
+        ]
+    )
+    run(
+        [
+            sys.executable,
+            "scripts/build_sqlite_db.py",
+            "--scraped",
+            str(scraped),
+            "--drafts",
+            str(drafts),
+            "--db",
+            str(db),
+            "--related-k",
+            str(args.related_k),
+            "--related-block-mb",
+            str(args.related_block_mb),
+            *(["--dedup-map", str(dedup_map)] if dedup_map else []),
+            *profile_args("build"),
         ]
     )
-    print(f"pipeline complete scraped={scraped} drafts={drafts}")
+    print(f"pipeline complete scraped={scraped} drafts={drafts} db={db}")
 
 
 if __name__ == "__main__":
@@ -4,18 +4,28 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import concurrent.futures as cf
+import hashlib
 import json
+import os
 import re
 import time
 from dataclasses import dataclass
+from html import escape as html_escape
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
+from crawl_state import CrawlState
+from html_archive import ArchiveReader, HtmlArchive
+from http_cache import HttpCache
+from profiling import STAGES, add_profile_args, start_profiler
+
 SITEMAP_INDEX = "https://islamqa.org/sitemap_index.xml"
 HEADERS = {
     "User-Agent": "QuranQA-ResearchBot/0.1 (+quranqa.org; educational use)",
@@ -37,12 +47,34 @@ def normalize_space(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
-def fetch_text(session: requests.Session, url: str, timeout: float = 30.0) -> str:
+def fetch_text(
+    session: requests.Session,
+    url: str,
+    timeout: float = 30.0,
+    cache: Optional[HttpCache] = None,
+) -> str:
+    return fetch_conditional(session, url, cache, timeout)[0]
+
+
+def fetch_conditional(
+    session: requests.Session,
+    url: str,
+    cache: Optional[HttpCache],
+    timeout: float = 30.0,
+) -> tuple[str, bool]:
+    """Fetch `url`, revalidating against `cache`; returns (text, unchanged)."""
+    cached = cache.lookup(url) if cache else None
+    headers = {**HEADERS, **cached.validators()} if cached else HEADERS
     for attempt in range(4):
         try:
-            res = session.get(url, headers=HEADERS, timeout=timeout)
+            res = session.get(url, headers=headers, timeout=timeout)
+            if res.status_code == 304 and cached is not None:
+                cache.touch(url)
+                return cached.text, True
             res.raise_for_status()
-            return res.text
+            if cache is not None:
+                cache.store(url, res.text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+            return res.text, False
         except Exception:
             if attempt == 3:
                 raise
@@ -50,9 +82,173 @@ def fetch_text(session: requests.Session, url: str, timeout: float = 30.0) -> st
     raise RuntimeError(f"unreachable fetch loop: {url}")
 
 
+class TokenBucket:
+    """Async token bucket allowing `rate` requests/sec with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """One token bucket per host so politeness holds even across sitemap hosts."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str) -> None:
+        host = urlparse(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+
+async def fetch_text_async(
+    session,
+    url: str,
+    limiter: HostRateLimiter,
+    timeout: float = 30.0,
+    cache: Optional[HttpCache] = None,
+) -> str:
+    import aiohttp
+
+    # The cache is SQLite plus zlib; its calls run in the default executor, off the event loop.
+    loop = asyncio.get_running_loop()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    cached = await loop.run_in_executor(None, cache.lookup, url) if cache else None
+    headers = {**HEADERS, **cached.validators()} if cached else HEADERS
+    for attempt in range(4):
+        await limiter.acquire(url)
+        try:
+            async with session.get(url, headers=headers, timeout=client_timeout) as res:
+                if res.status == 304 and cached is not None:
+                    await loop.run_in_executor(None, cache.touch, url)
+                    return cached.text
+                res.raise_for_status()
+                text = await res.text()
+                if cache is not None:
+                    await loop.run_in_executor(
+                        None, cache.store, url, text, res.headers.get("ETag"), res.headers.get("Last-Modified")
+                    )
+                return text
+        except Exception:
+            if attempt == 3:
+                raise
+            await asyncio.sleep(0.5 * (attempt + 1))
+    raise RuntimeError(f"unreachable fetch loop: {url}")
+
+
+def iter_sitemap_entries(chunks: Iterable[bytes]) -> Iterator[tuple[str, str]]:
+    """Incrementally parse sitemap XML, yielding (loc, lastmod) per <url>/<sitemap>.
+
+    Elements are cleared as soon as they are consumed, so memory stays flat
+    no matter how large the sitemap is.
+    """
+    from lxml import etree
+
+    parser = etree.XMLPullParser(events=("end",), resolve_entities=False, huge_tree=True)
+
+    def drain() -> Iterator[tuple[str, str]]:
+        for _, el in parser.read_events():
+            if not isinstance(el.tag, str) or el.tag.rpartition("}")[2] not in ("url", "sitemap"):
+                continue
+            loc = lastmod = ""
+            for child in el:
+                if not isinstance(child.tag, str):
+                    continue
+                name = child.tag.rpartition("}")[2]
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (child.text or "").strip()
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+            if loc:
+                yield loc, lastmod
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
 def parse_xml_locs(xml_text: str) -> list[str]:
-    soup = BeautifulSoup(xml_text, "xml")
-    return [node.get_text(strip=True) for node in soup.find_all("loc")]
+    return [loc for loc, _ in iter_sitemap_entries([xml_text.encode("utf-8")])]
+
+
+def stream_sitemap_entries(
+    session: requests.Session,
+    url: str,
+    cache: Optional[HttpCache] = None,
+    timeout: float = 30.0,
+) -> Iterator[tuple[str, str]]:
+    """Yield (loc, lastmod) pairs while the sitemap is still downloading.
+
+    With a cache, a 304 replays the stored parse without touching the XML.
+    Retries only cover the request itself; a failure mid-body propagates.
+    """
+    cached = cache.lookup(url) if cache else None
+    headers = {**HEADERS, **cached.validators()} if cached else HEADERS
+    for attempt in range(4):
+        try:
+            res = session.get(url, headers=headers, timeout=timeout, stream=True)
+            res.raise_for_status()
+            break
+        except Exception:
+            if attempt == 3:
+                raise
+            time.sleep(0.5 * (attempt + 1))
+
+    with res:
+        if res.status_code == 304 and cached is not None:
+            cache.touch(url)
+            entries = cache.load_derived(url)
+            if entries is None:
+                entries = list(iter_sitemap_entries([cached.text.encode("utf-8")]))
+                cache.store_derived(url, entries)
+            for loc, lastmod in entries:
+                yield loc, lastmod
+            return
+
+        body: list[bytes] = []
+        entries = []
+
+        def chunks() -> Iterator[bytes]:
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                if cache is not None:
+                    body.append(chunk)
+                yield chunk
+
+        for entry in iter_sitemap_entries(chunks()):
+            if cache is not None:
+                entries.append(entry)
+            yield entry
+
+        if cache is not None:
+            text = b"".join(body).decode("utf-8", errors="replace")
+            cache.store(url, text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+            cache.store_derived(url, entries)
 
 
 def extract_question_answer(raw: str) -> tuple[str, str]:
@@ -87,6 +283,12 @@ class ScrapedEntry:
     def as_json(self) -> str:
         return json.dumps(self.__dict__, ensure_ascii=False)
 
+    def content_hash(self) -> str:
+        payload = json.dumps(
+            [self.title, self.question, self.source_answer, self.raw_text], ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 def parse_url_meta(url: str) -> tuple[Optional[int], str, str]:
     parts = [p for p in urlparse(url).path.split("/") if p]
@@ -103,11 +305,7 @@ def parse_url_meta(url: str) -> tuple[Optional[int], str, str]:
     return post_id, madhhab, source
 
 
-def scrape_one(session: requests.Session, url: str) -> Optional[ScrapedEntry]:
-    try:
-        html = fetch_text(session, url)
-    except Exception:
-        return None
+def extract_bs4(html: str) -> tuple[str, str]:
     soup = BeautifulSoup(html, "html.parser")
 
     title_node = soup.select_one("h1") or soup.select_one(".entry-title")
@@ -115,6 +313,97 @@ def scrape_one(session: requests.Session, url: str) -> Optional[ScrapedEntry]:
 
     title = normalize_space(title_node.get_text(" ", strip=True)) if title_node else ""
     raw_text = normalize_space(content_node.get_text(" ", strip=True)) if content_node else ""
+    return title, raw_text
+
+
+# BeautifulSoup's get_text() skips these containers' strings (plus comments/PIs).
+LXML_SKIP_TEXT_TAGS = frozenset({"script", "style", "template", "rt", "rp"})
+
+
+def _lxml_text(node) -> str:
+    """Mirror of bs4 `get_text(" ", strip=True)` for an lxml element."""
+    parts: list[str] = []
+
+    def walk(el) -> None:
+        if el.text:
+            parts.append(el.text)
+        for child in el:
+            if isinstance(child.tag, str) and child.tag not in LXML_SKIP_TEXT_TAGS:
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(node)
+    return " ".join(p for p in (part.strip() for part in parts) if p)
+
+
+# Where libxml2 and html.parser disagree, the page is rewritten so lxml sees what bs4 sees:
+# - CDATA sections are text to html.parser but dropped by libxml2, so they become escaped text;
+# - libxml2 keeps markup inside these raw-text elements as literal text, while html.parser
+#   parses it like any other element's, so they are renamed to an unknown tag;
+# - NUL, which libxml2 would turn into U+FFFD, goes through as a noncharacter and is put back.
+# Still divergent: an unterminated `<![CDATA[` is text up to the end of the page for
+# html.parser and an ignored section for libxml2.
+_LXML_CDATA_RE = re.compile(r"<!\[CDATA\[(.*?)\]\]>", re.S)
+_LXML_RAW_TEXT_TAG_RE = re.compile(r"<(/?)(textarea|xmp|iframe|noembed|noframes|plaintext)\b", re.I)
+
+
+# Noncharacters libxml2 passes through unchanged; the first one absent from the page stands in for NUL.
+_LXML_NUL_STANDINS = [chr(c) for c in range(0xFDD0, 0xFDF0)]
+
+
+def _lxml_source(html: str, nul: str) -> str:
+    html = _LXML_CDATA_RE.sub(lambda m: html_escape(m.group(1), quote=False), html.replace("\x00", nul))
+    return _LXML_RAW_TEXT_TAG_RE.sub(r"<\1x-\2", html)
+
+
+def _lxml_first_by_class(root, cls: str):
+    found = root.xpath(f"(//*[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')])[1]")
+    return found[0] if found else None
+
+
+def extract_lxml(html: str) -> tuple[str, str]:
+    """libxml2-backed equivalent of `extract_bs4`; only the target nodes are walked."""
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    nul = "\x00"
+    if nul in html:
+        nul = next((c for c in _LXML_NUL_STANDINS if c not in html), nul)
+    try:
+        root = lxml_html.document_fromstring(
+            _lxml_source(html, nul).encode("utf-8"), parser=lxml_html.HTMLParser(encoding="utf-8")
+        )
+    except etree.ParserError:
+        return "", ""
+
+    title_node = root.find(".//h1")
+    if title_node is None:
+        title_node = _lxml_first_by_class(root, "entry-title")
+    content_node = _lxml_first_by_class(root, "entry-content")
+    if content_node is None:
+        content_node = _lxml_first_by_class(root, "post-content")
+
+    title = normalize_space(_lxml_text(title_node)) if title_node is not None else ""
+    raw_text = normalize_space(_lxml_text(content_node)) if content_node is not None else ""
+    if nul != "\x00":
+        title, raw_text = title.replace(nul, "\x00"), raw_text.replace(nul, "\x00")
+    return title, raw_text
+
+
+EXTRACTORS = {
+    "bs4": extract_bs4,
+    "lxml": extract_lxml,
+}
+
+
+def parse_post(
+    url: str,
+    html: str,
+    extractor: str = "bs4",
+    scraped_at_unix: Optional[int] = None,
+) -> Optional[ScrapedEntry]:
+    title, raw_text = EXTRACTORS[extractor](html)
     if not title and not raw_text:
         return None
 
@@ -130,8 +419,306 @@ def scrape_one(session: requests.Session, url: str) -> Optional[ScrapedEntry]:
         question=question,
         source_answer=source_answer,
         raw_text=raw_text,
-        scraped_at_unix=int(time.time()),
+        scraped_at_unix=scraped_at_unix if scraped_at_unix is not None else int(time.time()),
+    )
+
+
+def scrape_one(
+    session: requests.Session,
+    url: str,
+    cache: Optional[HttpCache] = None,
+    extractor: str = "bs4",
+    parse_pool: Optional[cf.Executor] = None,
+    archive: Optional[HtmlArchive] = None,
+) -> Optional[ScrapedEntry]:
+    started = time.perf_counter()
+    try:
+        html = fetch_text(session, url, cache=cache)
+    except Exception:
+        return None
+    finally:
+        STAGES.add("fetch", time.perf_counter() - started)
+    if archive is not None:
+        archive.put(url, html, int(time.time()))
+    with STAGES.time("parse"):
+        if parse_pool is not None:
+            return parse_pool.submit(parse_post, url, html, extractor).result()
+        return parse_post(url, html, extractor)
+
+
+class CheckpointWriter:
+    """Commit scraped records to the output JSONL and crawl state in atomic batches.
+
+    Lines are buffered and appended with a single write + fsync; only then is
+    the crawl state committed, so a killed run never marks undelivered work
+    done. At worst a crash between the two re-scrapes one batch, and the
+    duplicate lines are harmless to the url-keyed DB upsert.
+    """
+
+    def __init__(
+        self,
+        out,
+        state: CrawlState,
+        limit: int,
+        batch_size: int = 100,
+        max_attempts: int = 5,
+        backoff_base: float = 60.0,
+        archive: Optional[HtmlArchive] = None,
+    ) -> None:
+        self.out = out
+        self.state = state
+        self.archive = archive
+        self.limit = limit
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.lines: list[str] = []
+        self.processed = 0
+        self.written = 0
+        self.failed = 0
+
+    def add(self, url: str, lastmod: str, item: Optional[ScrapedEntry]) -> None:
+        if item is None:
+            self.failed += 1
+            self.state.mark_failed(url, "fetch failed or page empty", self.max_attempts, self.backoff_base)
+        elif self.written >= self.limit:
+            # Overshoot from in-flight workers stays pending for the next --resume.
+            return
+        else:
+            if record_entry(self.state, item, lastmod):
+                self.lines.append(item.as_json() + "\n")
+                self.written += 1
+            self.state.mark_done(url)
+        self.processed += 1
+        if self.processed % self.batch_size == 0:
+            self.commit()
+            print(f"scraped={self.written} processed={self.processed} failed={self.failed}")
+
+    def commit(self) -> None:
+        with STAGES.time("commit"):
+            if self.archive is not None:
+                self.archive.flush()
+            if self.lines:
+                self.deliver(self.lines)
+                self.lines.clear()
+            self.state.flush()
+
+    def deliver(self, lines: list[str]) -> None:
+        """Make `lines` durable; the crawl state referencing them is committed only afterwards."""
+        self.out.write("".join(lines))
+        self.out.flush()
+        os.fsync(self.out.fileno())
+
+
+def repair_jsonl_tail(path: Path) -> int:
+    """Truncate a partial trailing line left by a killed writer; returns bytes dropped."""
+    if not path.exists():
+        return 0
+    with path.open("rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            if pos == end and block.endswith(b"\n"):
+                return 0
+            nl = block.rfind(b"\n")
+            if nl != -1:
+                keep = pos - step + nl + 1
+                f.truncate(keep)
+                return end - keep
+            pos -= step
+        f.truncate(0)
+        return end
+
+
+def scrape_threaded(
+    candidates: Iterator[tuple[str, str]],
+    writer: CheckpointWriter,
+    target: int,
+    workers: int,
+    session: requests.Session,
+    cache: Optional[HttpCache] = None,
+    extractor: str = "bs4",
+    parse_pool: Optional[cf.Executor] = None,
+) -> None:
+    """Fetch (url, lastmod) `candidates` on a thread pool with a bounded window."""
+    archive = writer.archive
+    with cf.ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight: dict[cf.Future, tuple[str, str]] = {}
+        while writer.written < target:
+            while len(in_flight) < workers * 2:
+                with STAGES.time("discover"):
+                    candidate = next(candidates, None)
+                if candidate is None:
+                    break
+                url, _ = candidate
+                fut = pool.submit(scrape_one, session, url, cache, extractor, parse_pool, archive)
+                in_flight[fut] = candidate
+            if not in_flight:
+                break
+            done, _ = cf.wait(in_flight, return_when=cf.FIRST_COMPLETED)
+            for fut in done:
+                url, lastmod = in_flight.pop(fut)
+                writer.add(url, lastmod, fut.result())
+        for fut in in_flight:
+            fut.cancel()
+
+
+async def scrape_async(
+    candidates: Iterator[tuple[str, str]],
+    writer: CheckpointWriter,
+    target: int,
+    concurrency: int,
+    rate: float,
+    burst: int,
+    cache: Optional[HttpCache] = None,
+    extractor: str = "bs4",
+    parse_pool: Optional[cf.Executor] = None,
+) -> None:
+    """Fetch (url, lastmod) `candidates` with at most `concurrency` requests in flight.
+
+    Workers pull from the shared iterator, so only `concurrency` pages are held
+    in memory at once. The iterator may block on sitemap downloads, so it is
+    advanced in the default executor; HTML parsing runs in `parse_pool` (or the
+    default executor) to keep the event loop free for I/O. Archive writes and
+    `writer.add` (crawl-state writes and fsynced checkpoints) run in order on
+    one dedicated thread.
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    limiter = HostRateLimiter(rate, burst)
+    feed_lock = asyncio.Lock()
+
+    async def next_candidate() -> Optional[tuple[str, str]]:
+        async with feed_lock:
+            started = time.perf_counter()
+            try:
+                return await loop.run_in_executor(None, next, candidates, None)
+            finally:
+                STAGES.add("discover", time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        keepalive_timeout=30,
+        ttl_dns_cache=300,
     )
+    store_pool = cf.ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrape-store")
+
+    async def store(fn: Callable, *args) -> None:
+        await loop.run_in_executor(store_pool, fn, *args)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def worker() -> None:
+            while writer.written < target:
+                candidate = await next_candidate()
+                if candidate is None:
+                    return
+                url, lastmod = candidate
+                started = time.perf_counter()
+                try:
+                    html = await fetch_text_async(session, url, limiter, cache=cache)
+                except Exception:
+                    await store(writer.add, url, lastmod, None)
+                    continue
+                finally:
+                    STAGES.add("fetch", time.perf_counter() - started)
+                if writer.archive is not None:
+                    await store(writer.archive.put, url, html, int(time.time()))
+                started = time.perf_counter()
+                item = await loop.run_in_executor(parse_pool, parse_post, url, html, extractor)
+                STAGES.add("parse", time.perf_counter() - started)
+                await store(writer.add, url, lastmod, item)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            store_pool.shutdown(wait=True)
+
+
+def reparse_chunk(
+    archive_root: str, records: list[tuple[str, int, int, int, int]], extractor: str
+) -> list[tuple[str, str, int, str]]:
+    """Re-extract one chunk of archive records into (url, content hash, fetched at, JSONL line)."""
+    reader = ArchiveReader(Path(archive_root))
+    items = []
+    try:
+        for url, fetched_at, segment, offset, length in records:
+            item = parse_post(url, reader.read(segment, offset, length), extractor, fetched_at)
+            if item is not None:
+                items.append((url, item.content_hash(), item.scraped_at_unix, item.as_json() + "\n"))
+    finally:
+        reader.close()
+    return items
+
+
+def reparse_archive(
+    archive_root: Path, output: Path, state: CrawlState, extractor: str, procs: int, chunk: int = 500
+) -> tuple[int, int]:
+    """Re-extract the records in `output` that have archived HTML, across `procs` processes.
+
+    Only URLs already in `output` are reparsed; archived pages that were never
+    written (e.g. overshoot left pending) stay for the next scrape. Lines with
+    no archived HTML, or that the extractor now rejects, are kept as they are.
+    Reparsed lines come first, in archive order. The new content hashes are
+    recorded in `state` once the output has been replaced. Returns
+    (reparsed, kept) line counts.
+    """
+    existing = load_existing_urls(output)
+    archive = HtmlArchive(archive_root)
+    tmp = output.with_name(output.name + ".tmp")
+    reparsed: set[str] = set()
+    hashes: list[tuple[str, str, int]] = []
+    kept = 0
+    try:
+        records = (r for r in archive.iter_records() if r[0] in existing)
+        chunks = iter(lambda: list(islice(records, chunk)), [])
+        with tmp.open("w", encoding="utf-8") as out:
+            with cf.ProcessPoolExecutor(max_workers=procs) as pool:
+                window: list[cf.Future] = []
+
+                def drain(fut: cf.Future) -> None:
+                    for url, content_hash, fetched_at, line in fut.result():
+                        out.write(line)
+                        reparsed.add(url)
+                        hashes.append((url, content_hash, fetched_at))
+
+                for batch in chunks:
+                    window.append(pool.submit(reparse_chunk, str(archive_root), batch, extractor))
+                    if len(window) >= procs * 2:
+                        drain(window.pop(0))
+                for fut in window:
+                    drain(fut)
+            if output.exists():
+                with output.open("r", encoding="utf-8") as src:
+                    for line in src:
+                        if not line.strip():
+                            continue
+                        try:
+                            url = json.loads(line).get("url")
+                        except json.JSONDecodeError:
+                            url = None
+                        if url not in reparsed:
+                            out.write(line)
+                            kept += 1
+            out.flush()
+            os.fsync(out.fileno())
+    finally:
+        archive.close()
+    os.replace(tmp, output)
+    for url, content_hash, fetched_at in hashes:
+        state.record(url, None, content_hash, fetched_at)
+    state.flush()
+    return len(hashes), kept
+
+
+def record_entry(state: CrawlState, item: ScrapedEntry, lastmod: str) -> bool:
+    """Update crawl state for `item`; False means the page content is unchanged."""
+    return state.record(item.url, lastmod, item.content_hash(), item.scraped_at_unix)
 
 
 def load_existing_urls(path: Path) -> set[str]:
@@ -152,21 +739,54 @@ def load_existing_urls(path: Path) -> set[str]:
     return seen
 
 
-def iter_post_urls(session: requests.Session) -> Iterable[str]:
-    idx_xml = fetch_text(session, SITEMAP_INDEX)
-    sitemaps = parse_xml_locs(idx_xml)
+def iter_post_entries(
+    session: requests.Session,
+    index_url: str = SITEMAP_INDEX,
+    cache: Optional[HttpCache] = None,
+) -> Iterator[tuple[str, str]]:
+    index_parts = urlparse(index_url)
+    site_prefix = f"{index_parts.scheme}://{index_parts.netloc}/"
+    sitemaps = [loc for loc, _ in stream_sitemap_entries(session, index_url, cache)]
     post_maps = [u for u in sitemaps if "sitemap-posts.xml" in u]
     for sm_url in post_maps:
         try:
-            sm_xml = fetch_text(session, sm_url)
+            for loc, lastmod in stream_sitemap_entries(session, sm_url, cache):
+                if not loc.startswith(site_prefix):
+                    continue
+                if "islamqa.info" in loc:
+                    continue
+                yield loc, lastmod
         except Exception:
             continue
-        for loc in parse_xml_locs(sm_xml):
-            if not loc.startswith("https://islamqa.org/"):
-                continue
-            if "islamqa.info" in loc:
-                continue
-            yield loc
+
+
+def iter_post_urls(
+    session: requests.Session,
+    index_url: str = SITEMAP_INDEX,
+    cache: Optional[HttpCache] = None,
+) -> Iterator[str]:
+    for loc, _ in iter_post_entries(session, index_url, cache):
+        yield loc
+
+
+def iter_candidates(
+    session: requests.Session,
+    state: CrawlState,
+    index_url: str = SITEMAP_INDEX,
+    cache: Optional[HttpCache] = None,
+    resume: bool = False,
+) -> Iterator[tuple[str, str]]:
+    """(url, lastmod) to fetch: the resumable backlog first, then new or changed sitemap URLs."""
+    resumed: set[str] = set()
+    if resume:
+        for u, lastmod in state.iter_backlog():
+            resumed.add(u)
+            yield u, lastmod
+    for u, lastmod in iter_post_entries(session, index_url, cache):
+        if u in resumed or not state.needs_fetch(u, lastmod):
+            continue
+        state.enqueue(u, lastmod)
+        yield u, lastmod
 
 
 def main() -> None:
@@ -174,41 +794,159 @@ def main() -> None:
     parser.add_argument("--output", required=True, help="Output JSONL path")
     parser.add_argument("--limit", type=int, default=2000, help="Max records")
     parser.add_argument("--workers", type=int, default=12, help="Parallel workers")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="Fetch engine: thread pool over requests, or asyncio over aiohttp",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="Async engine: max requests/sec per host (0 = unlimited)",
+    )
+    parser.add_argument("--burst", type=int, default=4, help="Async engine: token bucket burst size")
+    parser.add_argument("--sitemap-index", default=SITEMAP_INDEX, help="Sitemap index URL")
+    parser.add_argument(
+        "--http-cache",
+        default="",
+        help="SQLite file for the conditional-GET response cache (disabled when empty)",
+    )
+    parser.add_argument("--http-cache-mb", type=int, default=512, help="Response cache size cap in MB")
+    parser.add_argument(
+        "--state",
+        default="",
+        help="Crawl-state SQLite path (default: <output>.state.sqlite3)",
+    )
+    parser.add_argument(
+        "--extractor",
+        choices=sorted(EXTRACTORS),
+        default="bs4",
+        help="HTML extraction backend (lxml is C-backed and output-identical)",
+    )
+    parser.add_argument(
+        "--parse-procs",
+        type=int,
+        default=0,
+        help="Run extraction in a process pool of this size (0 = in the fetch workers)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Finish the pending work queue left by an interrupted run before discovering new URLs",
+    )
+    parser.add_argument("--batch-size", type=int, default=100, help="Records per durable checkpoint")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before a URL is marked failed")
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=60.0,
+        help="Base seconds for exponential retry backoff of failed URLs",
+    )
+    parser.add_argument(
+        "--archive",
+        default="",
+        help="Directory of the zstd raw-HTML archive to append to (or read with --reparse)",
+    )
+    parser.add_argument(
+        "--reparse",
+        action="store_true",
+        help="Re-extract the --output records that have HTML in --archive, without network access",
+    )
+    add_profile_args(parser)
     args = parser.parse_args()
+    start_profiler(args)
 
     output = Path(args.output)
     output.parent.mkdir(parents=True, exist_ok=True)
 
+    state_path = Path(args.state) if args.state else output.with_suffix(".state.sqlite3")
+    if args.reparse:
+        if not args.archive:
+            parser.error("--reparse requires --archive")
+        procs = args.parse_procs or os.cpu_count() or 1
+        dropped = repair_jsonl_tail(output)
+        if dropped:
+            print(f"repaired partial trailing line bytes={dropped} output={output}")
+        state = CrawlState(state_path)
+        try:
+            reparsed, kept = reparse_archive(Path(args.archive), output, state, args.extractor, procs)
+        finally:
+            state.close()
+        print(f"done reparsed={reparsed} kept={kept} output={output}")
+        return
+
     session = requests.Session()
-    seen_urls = load_existing_urls(output)
+    cache = HttpCache(Path(args.http_cache), args.http_cache_mb * 1024 * 1024) if args.http_cache else None
+    state = CrawlState(state_path)
+    if state.is_empty() and output.exists():
+        # One-time migration; later runs never rescan the output JSONL.
+        imported = state.import_urls(load_existing_urls(output))
+        print(f"imported crawl state urls={imported}")
+    archive = HtmlArchive(Path(args.archive)) if args.archive else None
     target = args.limit
-
-    candidate_urls = []
-    for u in iter_post_urls(session):
-        if u in seen_urls:
-            continue
-        candidate_urls.append(u)
-        if len(candidate_urls) >= target * 2:
-            break
-
-    written = 0
-    with output.open("a", encoding="utf-8") as out, cf.ThreadPoolExecutor(
-        max_workers=max(1, args.workers)
-    ) as pool:
-        futures = [pool.submit(scrape_one, session, u) for u in candidate_urls]
-        for fut in cf.as_completed(futures):
-            item = fut.result()
-            if item is None:
-                continue
-            out.write(item.as_json() + "\n")
-            written += 1
-            if written % 100 == 0:
-                out.flush()
-                print(f"scraped={written}")
-            if written >= target:
-                break
-
-    print(f"done wrote={written} output={output}")
+    parse_pool = cf.ProcessPoolExecutor(max_workers=args.parse_procs) if args.parse_procs > 0 else None
+
+    dropped = repair_jsonl_tail(output)
+    if dropped:
+        print(f"repaired partial trailing line bytes={dropped} output={output}")
+
+    # Lazily evaluated: workers start as soon as the first sitemap URLs arrive.
+    candidates = islice(iter_candidates(session, state, args.sitemap_index, cache, args.resume), target * 2)
+
+    with output.open("a", encoding="utf-8") as out:
+        writer = CheckpointWriter(
+            out,
+            state,
+            target,
+            batch_size=args.batch_size,
+            max_attempts=args.max_attempts,
+            backoff_base=args.retry_backoff,
+            archive=archive,
+        )
+        try:
+            if args.engine == "async":
+                asyncio.run(
+                    scrape_async(
+                        candidates,
+                        writer,
+                        target,
+                        concurrency=max(1, args.workers),
+                        rate=args.rate,
+                        burst=args.burst,
+                        cache=cache,
+                        extractor=args.extractor,
+                        parse_pool=parse_pool,
+                    )
+                )
+            else:
+                scrape_threaded(
+                    candidates,
+                    writer,
+                    target,
+                    workers=max(1, args.workers),
+                    session=session,
+                    cache=cache,
+                    extractor=args.extractor,
+                    parse_pool=parse_pool,
+                )
+        finally:
+            writer.commit()
+            if parse_pool is not None:
+                parse_pool.shutdown()
+            counts = state.queue_counts()
+            state.close()
+            if cache is not None:
+                cache.close()
+            if archive is not None:
+                archive.close()
+
+    STAGES.print_report()
+    print(
+        f"done wrote={writer.written} processed={writer.processed} failed={writer.failed} "
+        f"pending={counts.get('pending', 0)} output={output}"
+    )
 
 
 if __name__ == "__main__":
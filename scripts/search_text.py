@@ -0,0 +1,76 @@
+"""Text folding shared by the FTS index builder and the search API."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Optional
+
+# FTS5's unicode61 tokenizer folds case and Latin accents but leaves Arabic
+# harakat, tatweel and letter variants alone, so those are folded here before
+# text is indexed and before queries are matched.
+_ARABIC_MARKS = [chr(c) for c in range(0x064B, 0x0660)] + [
+    "ـ",  # tatweel
+    "ٰ",  # superscript alef
+    *[chr(c) for c in range(0x06D6, 0x06EE)],  # Quranic annotation marks
+]
+_ARABIC_LETTERS = {
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ؤ": "و",
+    "ئ": "ي",
+}
+_FOLD_TABLE = str.maketrans({**{m: None for m in _ARABIC_MARKS}, **_ARABIC_LETTERS})
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Strip Arabic diacritics and normalise alef/yaa/taa marbuta variants."""
+    return (text or "").translate(_FOLD_TABLE)
+
+
+def fold_with_offsets(text: str) -> tuple[str, list[int]]:
+    """`fold(text)` plus the index in `text` of each folded character, then len(text)."""
+    chars: list[str] = []
+    offsets: list[int] = []
+    for i, c in enumerate(text):
+        mapped = _FOLD_TABLE.get(ord(c), c)
+        if mapped is not None:
+            chars.append(mapped)
+            offsets.append(i)
+    offsets.append(len(text))
+    return "".join(chars), offsets
+
+
+def token_spans(text: str) -> list[tuple[int, int, str]]:
+    """(start, end, folded token) for each token the index sees, as offsets into the unfolded `text`.
+
+    A span runs up to the next kept character, so marks folded away after a word stay with it.
+    """
+    folded, offsets = fold_with_offsets(text)
+    return [(offsets[m.start()], offsets[m.end()], m.group()) for m in _TOKEN_RE.finditer(folded)]
+
+
+def match_key(token: str) -> str:
+    """Lower-cased and stripped of combining marks, as FTS5's unicode61 tokenizer compares tokens."""
+    return "".join(c for c in unicodedata.normalize("NFD", token.lower()) if not unicodedata.combining(c))
+
+
+def query_terms(q: str) -> list[str]:
+    """`match_key` of each searchable token in `q`; a token matches a term it starts with."""
+    return [match_key(token) for token in _TOKEN_RE.findall(fold(q))]
+
+
+def match_query(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression: every token, prefix-matched.
+
+    Returns None when `q` has no searchable tokens.
+    """
+    tokens = _TOKEN_RE.findall(fold(q))
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Serve a synthetic islamqa.org-shaped site for offline scraper benchmarks."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MADHHABS = ["hanafi", "shafii", "maliki", "hanbali"]
+SOURCES = ["daruliftaa", "askimam", "hadithanswers", "muftionline"]
+TOPIC_WORDS = [
+    "interest on a bank loan",
+    "wine in cooking",
+    "a lottery ticket",
+    "gelatin capsules",
+    "marriage without a guardian",
+    "prayer while travelling",
+    "insulin during Ramadan",
+    "AI generated images",
+]
+ARABIC_LINES = [
+    "السؤال: ما حكم هذا الأمر؟",
+    "الجواب: الحمد لله رب العالمين.",
+    "والله أعلم بالصواب.",
+]
+
+
+class Stats:
+    """Request counters shared by handler threads."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified_count = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.recent: deque[float] = deque()
+        self.peak_per_sec = 0
+        self.started = time.time()
+
+    def enter(self) -> None:
+        now = time.monotonic()
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.recent.append(now)
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            self.peak_per_sec = max(self.peak_per_sec, len(self.recent))
+
+    def not_modified(self) -> None:
+        with self.lock:
+            self.not_modified_count += 1
+
+    def leave(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            elapsed = max(1e-9, time.time() - self.started)
+            return {
+                "requests": self.requests,
+                "not_modified": self.not_modified_count,
+                "peak_in_flight": self.peak_in_flight,
+                "peak_requests_per_sec": self.peak_per_sec,
+                "mean_requests_per_sec": round(self.requests / elapsed, 2),
+            }
+
+
+def post_path(post_id: int) -> str:
+    madhhab = MADHHABS[post_id % len(MADHHABS)]
+    source = SOURCES[(post_id // len(MADHHABS)) % len(SOURCES)]
+    return f"/{madhhab}/{source}/{post_id}/question-{post_id}/"
+
+
+def render_post(post_id: int) -> str:
+    topic = TOPIC_WORDS[post_id % len(TOPIC_WORDS)]
+    filler = " ".join(f"<p>Detail {i} regarding {topic}.</p>" for i in range(post_id % 7 + 3))
+    arabic = "".join(f"<p>{line}</p>" for line in ARABIC_LINES)
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>Question {post_id}</title><script>var x = 1;</script></head><body>"
+        "<nav><a href='/'>Home</a></nav>"
+        f"<h1 class='entry-title'>Ruling on {topic} (#{post_id})</h1>"
+        "<div class='entry-content'>"
+        f"<p><strong>Question:</strong> What is the ruling on {topic}?</p>"
+        f"<p><strong>Answer:</strong> In the Name of Allah.</p>{filler}{arabic}"
+        "</div><footer>Stub footer</footer></body></html>"
+    )
+
+
+def make_handler(args: argparse.Namespace, stats: Stats) -> type[BaseHTTPRequestHandler]:
+    pages = (args.posts + args.per_sitemap - 1) // args.per_sitemap
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt: str, *fargs) -> None:
+            return
+
+        def send_body(self, body: str, content_type: str, status: int = 200) -> None:
+            data = body.encode("utf-8")
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                stats.not_modified()
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 200:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            stats.enter()
+            try:
+                if args.latency_ms:
+                    time.sleep(args.latency_ms / 1000.0)
+                self.route()
+            finally:
+                stats.leave()
+
+        def route(self) -> None:
+            parsed = urlparse(self.path)
+            base = f"http://{self.headers.get('Host', f'{args.host}:{args.port}')}"
+            if parsed.path == "/__stats":
+                self.send_body(json.dumps(stats.snapshot()), "application/json")
+            elif parsed.path == "/sitemap_index.xml":
+                items = "".join(
+                    f"<sitemap><loc>{base}/sitemap-posts.xml?page={p}</loc></sitemap>"
+                    for p in range(1, pages + 1)
+                )
+                self.send_body(
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</sitemapindex>',
+                    "application/xml",
+                )
+            elif parsed.path == "/sitemap-posts.xml":
+                page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+                start = (page - 1) * args.per_sitemap + 1
+                end = min(args.posts, page * args.per_sitemap)
+                items = "".join(
+                    f"<url><loc>{base}{post_path(i)}</loc><lastmod>2026-01-01T00:00:00+00:00</lastmod></url>"
+                    for i in range(start, end + 1)
+                )
+                self.send_body(
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</urlset>',
+                    "application/xml",
+                )
+            else:
+                parts = [p for p in parsed.path.split("/") if p]
+                if len(parts) >= 4 and parts[2].isdigit() and 1 <= int(parts[2]) <= args.posts:
+                    self.send_body(render_post(int(parts[2])), "text/html; charset=utf-8")
+                else:
+                    self.send_body("not found", "text/plain", status=404)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a stub islamqa.org for offline scraper benchmarks")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8765, help="Bind port")
+    parser.add_argument("--posts", type=int, default=5000, help="Number of synthetic posts")
+    parser.add_argument("--per-sitemap", type=int, default=1000, help="Posts per sitemap page")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Artificial per-request latency")
+    args = parser.parse_args()
+
+    stats = Stats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, stats))
+    server.daemon_threads = True
+    print(f"serving http://{args.host}:{args.port}/sitemap_index.xml posts={args.posts}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"stats {json.dumps(stats.snapshot())}")
+
+
+if __name__ == "__main__":
+    main()
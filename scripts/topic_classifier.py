@@ -0,0 +1,103 @@
+"""Batch topic classification: naive Bayes over rule-keyword hits and words, scored with sparse matrix products."""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+
+# Bump when features or fitting change, so drafts classified by an older model are regenerated.
+CLASSIFIER_VERSION = 1
+
+# Pseudo-count each rule keyword starts with for its own topic; with no
+# training data the model then ranks topics much like keyword scoring does.
+KEYWORD_PRIOR = 10.0
+SMOOTHING = 0.1
+# Words seen in fewer training documents than this are not features.
+MIN_DF = 2
+
+
+def words(text: str) -> set[str]:
+    return set(_WORD_RE.findall(text))
+
+
+class TopicClassifier:
+    """Multinomial naive Bayes; each document is (matched keyword ids, words) and counts are binary.
+
+    Feature columns 0..num_keywords-1 are keyword ids as the caller's matcher
+    reports them; the rest are words from the training documents. Documents
+    with no known feature get topic -1 so the caller can fall back.
+    """
+
+    def __init__(self, num_keywords: int, vocab: dict[str, int], log_prob: np.ndarray, log_prior: np.ndarray) -> None:
+        self.num_keywords = num_keywords
+        self.vocab = vocab
+        self.log_prob = log_prob
+        self.log_prior = log_prior
+
+    @classmethod
+    def fit(
+        cls,
+        rule_keyword_ids: list[list[int]],
+        num_keywords: int,
+        docs: Iterable[tuple[set[int], set[str], int, float]],
+    ) -> "TopicClassifier":
+        """Fit from (keyword ids, words, topic index, weight) training documents."""
+        topics = len(rule_keyword_ids)
+        vocab: dict[str, int] = {}
+        cols: list[int] = []
+        doc_topics: list[int] = []
+        doc_weights: list[float] = []
+        lengths: list[int] = []
+        for found, doc_words, topic, weight in docs:
+            row = list(found) + [num_keywords + vocab.setdefault(w, len(vocab)) for w in doc_words]
+            cols.extend(row)
+            lengths.append(len(row))
+            doc_topics.append(topic)
+            doc_weights.append(weight)
+        features = num_keywords + len(vocab)
+        col = np.asarray(cols, dtype=np.int64)
+        topic = np.repeat(np.asarray(doc_topics, dtype=np.int64), lengths)
+        weight = np.repeat(np.asarray(doc_weights, dtype=np.float64), lengths)
+        counts = np.bincount(col * topics + topic, weights=weight, minlength=features * topics).reshape(features, topics)
+        for t, ids in enumerate(rule_keyword_ids):
+            counts[ids, t] += KEYWORD_PRIOR
+
+        # Drop rare words and renumber the rest; keyword columns always stay.
+        df = np.bincount(col, minlength=features)
+        keep = np.flatnonzero((np.arange(features) < num_keywords) | (df >= MIN_DF))
+        counts = counts[keep]
+        names = sorted(vocab, key=vocab.get)
+        vocab = {names[c - num_keywords]: i - num_keywords for i, c in enumerate(keep) if c >= num_keywords}
+
+        log_prob = np.log((counts + SMOOTHING) / (counts.sum(axis=0) + SMOOTHING * len(keep)))
+        per_topic = np.bincount(np.asarray(doc_topics, dtype=np.int64), weights=doc_weights, minlength=topics)
+        log_prior = np.log((per_topic + 1) / (per_topic.sum() + topics))
+        return cls(num_keywords, vocab, log_prob, log_prior)
+
+    def matrix(self, docs: list[tuple[set[int], set[str]]]) -> csr_matrix:
+        indptr = [0]
+        indices: list[int] = []
+        vocab, offset = self.vocab, self.num_keywords
+        for found, doc_words in docs:
+            indices.extend(found)
+            indices.extend(offset + vocab[w] for w in doc_words if w in vocab)
+            indptr.append(len(indices))
+        x = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(docs), self.log_prob.shape[0]))
+        # Set iteration order varies between processes; a fixed summation order keeps scores reproducible.
+        x.sort_indices()
+        return x
+
+    def predict(self, docs: list[tuple[set[int], set[str]]]) -> tuple[np.ndarray, np.ndarray]:
+        """Return (topic index, posterior probability) per document; index -1 where no feature is known."""
+        x = self.matrix(docs)
+        scores = x @ self.log_prob + self.log_prior
+        best = scores.argmax(axis=1)
+        shifted = np.exp(scores - scores[np.arange(len(docs)), best][:, None])
+        confidence = 1.0 / shifted.sum(axis=1)
+        best[np.diff(x.indptr) == 0] = -1
+        return best, confidence
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as api
+from build_sqlite_db import open_db
+
+
+@pytest.fixture
+def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
+    db = tmp_path / "q.sqlite3"
+    conn = open_db(db, batch_size=100)
+    with conn:
+        conn.executemany(
+            "INSERT INTO fatawa (id, url, title, topic, created_at_unix) VALUES (?, ?, ?, 'riba', 0)",
+            [(1, "https://a/1", "One"), (2, "https://a/2", "Two")],
+        )
+        conn.execute("INSERT INTO db_meta (key, value) VALUES ('generation', 1) ON CONFLICT(key) DO NOTHING")
+    conn.close()
+    monkeypatch.setattr(api, "DB_PATH", db)
+    monkeypatch.setattr(api, "READ_POOL", api.ReadPool(db, 2))
+    monkeypatch.setattr(api, "WRITER", api.Writer(db))
+    monkeypatch.setattr(api, "RESPONSE_CACHE", api.ResponseCache(64, 3600.0))
+    with TestClient(api.app) as c:
+        yield c
+
+
+def test_feedback_only_invalidates_its_own_detail_entry(client: TestClient) -> None:
+    listing = client.get("/api/fatawa", params={"total": "none"})
+    other = client.get("/api/fatawa/2")
+    assert client.get("/api/fatawa/1").json()["feedback"] == []
+
+    assert client.post("/api/feedback", json={"fatwa_id": 1, "comment": "cite the hadith"}).json() == {"ok": True}
+
+    hits = api.CACHE_LOOKUPS.labels("response", "hit")
+    before_hits = hits.value
+    assert [f["comment"] for f in client.get("/api/fatawa/1").json()["feedback"]] == ["cite the hadith"]
+    assert hits.value == before_hits
+    for path, params, before in (("/api/fatawa", {"total": "none"}, listing), ("/api/fatawa/2", {}, other)):
+        again = client.get(path, params=params, headers={"If-None-Match": before.headers["etag"]})
+        assert again.status_code == 304
+    assert hits.value == before_hits + 2
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from build_sqlite_db import delete_missing, open_db, refresh_neighbors
+
+
+def test_delete_missing_drops_neighbours_of_removed_rows(tmp_path: Path) -> None:
+    conn = open_db(tmp_path / "q.sqlite3", batch_size=100)
+    with conn:
+        conn.executemany(
+            "INSERT INTO fatawa (id, url, created_at_unix) VALUES (?, ?, 0)",
+            [(1, "https://a/1"), (2, "https://a/2"), (3, "https://a/3")],
+        )
+        conn.executemany(
+            "INSERT INTO fatwa_neighbors (fatwa_id, rank, neighbor_id, score) VALUES (?, ?, ?, 0.5)",
+            [(1, 1, 2), (1, 2, 3), (2, 1, 1), (3, 1, 1)],
+        )
+        conn.execute("CREATE TEMP TABLE seen_urls (url TEXT PRIMARY KEY)")
+        conn.executemany("INSERT INTO seen_urls (url) VALUES (?)", [("https://a/1",), ("https://a/3",)])
+
+        assert delete_missing(conn) == 1
+
+    rows = conn.execute("SELECT fatwa_id, neighbor_id FROM fatwa_neighbors ORDER BY fatwa_id, rank").fetchall()
+    assert rows == [(1, 3), (3, 1)]
+    assert conn.execute("SELECT fatwa_id FROM fatwa_neighbors_dirty").fetchall() == [(1,)]
+
+
+TOPICS = {
+    "zakat": "zakat gold silver nisab wealth year",
+    "riba": "riba interest loan bank mortgage debt",
+    "salah": "salah prayer qibla wudu times mosque",
+    "sawm": "fasting ramadan suhoor iftar moon kaffarah",
+}
+
+
+def add_fatawa(conn, rows: list[tuple[int, str]]) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT INTO fatawa (id, url, title, created_at_unix) VALUES (?, ?, ?, 0)",
+            [(i, f"https://a/{i}", title) for i, title in rows],
+        )
+        conn.executemany("INSERT OR IGNORE INTO fatwa_neighbors_dirty (fatwa_id) VALUES (?)", [(i,) for i, _ in rows])
+
+
+def neighbor_lists(conn) -> dict[int, list[int]]:
+    lists: dict[int, list[int]] = {}
+    for fatwa_id, neighbor_id in conn.execute("SELECT fatwa_id, neighbor_id FROM fatwa_neighbors ORDER BY 1, rank"):
+        lists.setdefault(fatwa_id, []).append(neighbor_id)
+    return lists
+
+
+def test_refresh_only_recomputes_rows_a_change_can_affect(tmp_path: Path) -> None:
+    conn = open_db(tmp_path / "q.sqlite3", batch_size=100)
+    rows = []
+    for t, (topic, words) in enumerate(TOPICS.items()):
+        vocab = words.split()
+        rows += [(t * 10 + j, f"{topic} {vocab[j % 6]} {vocab[(j + 2) % 6]} case{j}") for j in range(1, 6)]
+    add_fatawa(conn, rows)
+    assert refresh_neighbors(conn, k=3, block_mb=1) == len(rows)
+    before = neighbor_lists(conn)
+
+    add_fatawa(conn, [(99, "zakat gold nisab silver")])
+    refreshed = refresh_neighbors(conn, k=3, block_mb=1)
+
+    after = neighbor_lists(conn)
+    assert 99 in after and set(after[99]) <= {1, 2, 3, 4, 5}
+    assert 1 < refreshed <= 6
+    assert all(after[i] == before[i] for i in before if i // 10 != 0)
+    assert conn.execute("SELECT COUNT(*) FROM fatwa_neighbors_dirty").fetchone()[0] == 0
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+import scrape_islamqa_org
+from crawl_state import CrawlState
+
+URL = "https://islamqa.org/hanafi/daruliftaa/1/a/"
+
+
+def attempts(state: CrawlState) -> tuple[str, int]:
+    return state._conn.execute("SELECT status, attempts FROM queue WHERE url = ?", (URL,)).fetchone()
+
+
+def give_up(state: CrawlState, lastmod: str) -> None:
+    state.enqueue(URL, lastmod)
+    for _ in range(3):
+        state.mark_failed(URL, "timeout", max_attempts=3, backoff_base=0)
+
+
+def candidates(state: CrawlState, lastmod: str, resume: bool, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    monkeypatch.setattr(scrape_islamqa_org, "iter_post_entries", lambda session, index_url, cache: [(URL, lastmod)])
+    return [u for u, _ in scrape_islamqa_org.iter_candidates(None, state, resume=resume)]
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_backed_off_url_is_not_yielded_until_its_retry_is_due(
+    tmp_path: Path, resume: bool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    state = CrawlState(tmp_path / "state.sqlite3")
+    state.enqueue(URL, "2024-01-01")
+    state.mark_failed(URL, "timeout", max_attempts=3, backoff_base=3600)
+
+    assert candidates(state, "2024-01-01", resume, monkeypatch) == []
+    state._conn.execute("UPDATE queue SET next_attempt_at = 0 WHERE url = ?", (URL,))
+    assert candidates(state, "2024-01-01", resume, monkeypatch) == [URL]
+    assert attempts(state) == ("pending", 1)
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_given_up_url_is_not_yielded_until_lastmod_moves(
+    tmp_path: Path, resume: bool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    state = CrawlState(tmp_path / "state.sqlite3")
+    give_up(state, "2024-01-01")
+    assert attempts(state) == ("failed", 3)
+
+    assert candidates(state, "2024-01-01", resume, monkeypatch) == []
+    assert candidates(state, "2024-02-01", resume, monkeypatch) == [URL]
+
+
+def test_failed_url_retries_from_scratch_when_lastmod_moves(tmp_path: Path) -> None:
+    state = CrawlState(tmp_path / "state.sqlite3")
+    give_up(state, "2024-01-01")
+
+    state.enqueue(URL, "2024-02-01")
+    assert attempts(state) == ("pending", 0)
+
+
+def test_done_url_is_requeued_from_scratch(tmp_path: Path) -> None:
+    state = CrawlState(tmp_path / "state.sqlite3")
+    state.enqueue(URL, "2024-01-01")
+    state.mark_failed(URL, "timeout", max_attempts=3, backoff_base=0)
+    state.mark_done(URL)
+
+    state.enqueue(URL, "2024-02-01")
+    assert attempts(state) == ("pending", 0)
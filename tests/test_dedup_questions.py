@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from bench import ROOT
+from dedup_questions import candidate_pairs, dedup_text
+
+
+def test_every_pair_in_a_bucket_is_a_candidate() -> None:
+    rng = np.random.default_rng(0)
+    sig = rng.integers(0, 2**32, size=(6, 16), dtype=np.uint64).astype(np.uint32)
+    sig[[1, 3, 5]] = sig[1]
+    pairs = candidate_pairs(sig, bands=4, seed=1)
+    assert pairs.tolist() == [[1, 3], [1, 5], [3, 5]]
+
+
+def test_large_buckets_only_pair_nearby_rows() -> None:
+    sig = np.zeros((5, 8), dtype=np.uint32)
+    pairs = candidate_pairs(sig, bands=2, seed=1, max_bucket=2)
+    assert pairs.tolist() == [[0, 1], [1, 2], [2, 3], [3, 4]]
+
+
+def test_dedup_text_includes_title() -> None:
+    assert dedup_text({"title": "Riba?", "raw_text": "Question: Is riba allowed"}) == b"riba question is riba allowed"
+
+
+def test_short_and_title_only_entries_are_not_clustered(tmp_path: Path) -> None:
+    body = " ".join(f"word{i}" for i in range(60))
+    entries = [{"url": f"https://a/title{i}", "title": f"Title {i}", "raw_text": ""} for i in range(3)]
+    entries.append({"url": "https://a/short", "title": "Short", "raw_text": "Is it ok?"})
+    entries.append({"url": "https://a/1", "title": "Same", "raw_text": body})
+    entries.append({"url": "https://a/2", "title": "Same", "raw_text": body})
+    src, out = tmp_path / "scraped.jsonl", tmp_path / "dedup.jsonl"
+    src.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+
+    subprocess.run(
+        [sys.executable, str(ROOT / "scripts" / "dedup_questions.py"), "--input", str(src), "--output", str(out)],
+        check=True,
+        capture_output=True,
+    )
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert {r["url"]: r["canonical_url"] for r in rows} == {"https://a/1": "https://a/1", "https://a/2": "https://a/1"}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as api
+from build_sqlite_db import build_row, open_db, sync_rows
+
+DRAFTS = [
+    {"url": f"https://a/{i}", "title": f"T{i}", "topic": "riba", "generated_at_unix": 50, "topic_confidence": 0.5}
+    for i in range(1, 4)
+]
+
+
+def sync(conn: sqlite3.Connection, now: int, canonical: dict[str, str]) -> list[str]:
+    rows = [build_row(d, {}, now, canonical.get(d["url"])) for d in DRAFTS]
+    return sync_rows(conn, rows, Counter())
+
+
+@pytest.fixture
+def db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[sqlite3.Connection]:
+    path = tmp_path / "q.sqlite3"
+    conn = open_db(path, batch_size=100)
+    monkeypatch.setattr(api, "DB_PATH", path)
+    monkeypatch.setattr(api, "READ_POOL", api.ReadPool(path, 2))
+    yield conn
+    conn.close()
+
+
+def export(since: int) -> list[dict]:
+    with TestClient(api.app) as client:
+        body = client.get("/api/export", params={"since": since}).text
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_since_picks_up_rows_changed_only_by_canonical_url(db: sqlite3.Connection) -> None:
+    assert len(sync(db, 100, {})) == 3
+    assert sync(db, 200, {"https://a/2": "https://a/1"}) == ["https://a/2"]
+
+    rows = export(150)
+    assert [(r["url"], r["canonical_url"], r["updated_at_unix"]) for r in rows] == [
+        ("https://a/2", "https://a/1", 200)
+    ]
+    assert rows[0]["topic_confidence"] == 0.5 and rows[0]["created_at_unix"] == 100
+    assert [r["url"] for r in export(0)] == ["https://a/1", "https://a/3", "https://a/2"]
+
+
+def test_migrate_backfills_updated_at_from_generated_at(tmp_path: Path) -> None:
+    path = tmp_path / "old.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE fatawa (
+            id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT, question_summary TEXT, source_answer TEXT,
+            raw_text TEXT, topic TEXT, draft_fatwa_text TEXT, quran_references_json TEXT, principles_json TEXT,
+            madhhab TEXT, source_org TEXT, generated_at_unix INTEGER, scraped_at_unix INTEGER,
+            created_at_unix INTEGER NOT NULL
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO fatawa (id, url, generated_at_unix, created_at_unix) VALUES (?, ?, ?, ?)",
+        [(1, "https://a/1", 70, 10), (2, "https://a/2", None, 20)],
+    )
+    conn.commit()
+    conn.close()
+
+    conn = open_db(path, batch_size=100)
+    assert conn.execute("SELECT id, updated_at_unix FROM fatawa ORDER BY id").fetchall() == [(1, 70), (2, 20)]
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_fatawa_updated_at'").fetchone()
@@ -0,0 +1,40 @@
+"""bs4 and lxml extractors against the golden fixtures and the constructs their parsers disagree on."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from bench.parity import EXPECTED_PATH, extract_fields, load_fixtures
+from scrape_islamqa_org import EXTRACTORS
+
+FIXTURES = load_fixtures()
+EXPECTED = json.loads(EXPECTED_PATH.read_text(encoding="utf-8"))
+
+
+def page(content: str) -> str:
+    return f'<html><body><h1>Title</h1><div class="entry-content">{content}</div></body></html>'
+
+
+@pytest.mark.parametrize("extractor", sorted(EXTRACTORS))
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_fixture_matches_golden(name: str, extractor: str) -> None:
+    assert extract_fields(FIXTURES[name], extractor) == EXPECTED[name]
+
+
+@pytest.mark.parametrize(
+    "content, raw_text",
+    [
+        ("a <![CDATA[x <b>y</b> & z]]> b", "a x <b>y</b> & z b"),
+        ("a <textarea>x <b>y</b> &amp; z</textarea> b", "a x y & z b"),
+        ("a <TEXTAREA rows=2><![CDATA[c <q>]]></TEXTAREA> b", "a c <q> b"),
+        ("a <xmp>x <i>y</i></xmp> <iframe>i <a>j</a></iframe> <noembed>n</noembed> b", "a x y i j n b"),
+        ("a\x00b c\x00", "a\x00b c\x00"),
+        ("<b>x\x00</b>y \ufdd0", "x\x00 y \ufdd0"),
+        ('a <script>var s = "<textarea>";</script> b', "a b"),
+    ],
+)
+@pytest.mark.parametrize("extractor", sorted(EXTRACTORS))
+def test_parser_edge_cases(extractor: str, content: str, raw_text: str) -> None:
+    assert EXTRACTORS[extractor](page(content)) == ("Title", raw_text)
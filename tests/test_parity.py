@@ -0,0 +1,15 @@
+"""`python -m bench.parity` as a test: golden fixtures and synthetic round-trips under every extractor."""
+
+from __future__ import annotations
+
+from bench.corpus import DEFAULT_SEED
+from bench.parity import check_fixtures, check_synthetic
+from scrape_islamqa_org import EXTRACTORS
+
+
+def test_fixtures_match_expected() -> None:
+    assert check_fixtures(sorted(EXTRACTORS)) == []
+
+
+def test_synthetic_pages_round_trip() -> None:
+    assert check_synthetic(sorted(EXTRACTORS), 200, DEFAULT_SEED) == []
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from crawl_state import CrawlState
+from html_archive import HtmlArchive
+from scrape_islamqa_org import parse_post, reparse_archive
+
+BASE = "https://islamqa.org/hanafi/daruliftaa/{}/post/"
+
+
+def page(n: int) -> str:
+    return f'<h1>Title {n}</h1><div class="entry-content">Question: q{n}? Answer: a{n}.</div>'
+
+
+def test_reparse_merges_by_url_and_refreshes_state_hashes(tmp_path: Path) -> None:
+    archive = HtmlArchive(tmp_path / "archive")
+    for n in (1, 2, 3):
+        archive.put(BASE.format(n), page(n), 100 + n)
+    archive.close()
+    output = tmp_path / "out.jsonl"
+    stale = {"url": BASE.format(1), "title": "old extraction"}
+    legacy = {"url": BASE.format(9), "title": "scraped before --archive"}
+    # Page 3 was archived but never written (overshoot), so it must not appear.
+    output.write_text(json.dumps(stale) + "\n" + json.dumps(legacy) + "\n", encoding="utf-8")
+    state = CrawlState(tmp_path / "state.sqlite3")
+
+    assert reparse_archive(tmp_path / "archive", output, state, "bs4", procs=1) == (1, 1)
+
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [r["url"] for r in rows] == [BASE.format(1), BASE.format(9)]
+    assert rows[0]["title"] == "Title 1" and rows[1] == legacy
+    expected_hash = parse_post(BASE.format(1), page(1), "bs4", 101).content_hash()
+    assert not state.record(BASE.format(1), None, expected_hash, 101)
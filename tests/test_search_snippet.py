@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from app.main import highlight_snippet
+from scripts.search_text import query_terms
+
+
+def test_snippet_shows_stored_spelling_not_folded_text() -> None:
+    text = "ما حكم الفائدةُ على القرض؟"
+    assert highlight_snippet([None, text], query_terms("الفايده علي")) == (
+        "ما حكم <mark>الفائدةُ</mark> <mark>على</mark> القرض؟"
+    )
+
+
+def test_snippet_text_is_escaped_and_terms_are_prefix_and_accent_matched() -> None:
+    text = 'Café <img src=x onerror=alert(1)> & "riba" rulings'
+    assert highlight_snippet([text], query_terms("cafe rib")) == (
+        "<mark>Café</mark> &lt;img src=x onerror=alert(1)&gt; &amp; &quot;<mark>riba</mark>&quot; rulings"
+    )
+
+
+def test_snippet_window_prefers_the_densest_column_and_adds_ellipses() -> None:
+    body = " ".join(f"w{i}" for i in range(40)) + " zakat on gold " + " ".join(f"v{i}" for i in range(40))
+    snippet = highlight_snippet(["Fasting", "nothing here", body], query_terms("zakat gold"), size=6)
+    assert snippet == "…w38 w39 <mark>zakat</mark> on <mark>gold</mark> v0…"
+
+
+def test_snippet_without_text_is_empty() -> None:
+    assert highlight_snippet([None, ""], query_terms("riba")) == ""
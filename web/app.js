@@ -12,11 +12,19 @@ async function getJson(url, opts) {
   return res.json();
 }
 
+const HTML_ESCAPES = { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" };
+
+function escapeHtml(value) {
+  return String(value ?? "").replace(/[&<>"']/g, (c) => HTML_ESCAPES[c]);
+}
+
 function renderList(items) {
   listEl.innerHTML = "";
   for (const item of items) {
     const li = document.createElement("li");
-    li.innerHTML = `<strong>${item.title || "(untitled)"}</strong><div class="meta">${item.topic} | #${item.id}</div>`;
+    // The server escapes snippets and only adds <mark> highlights.
+    const snippet = item.snippet ? `<div class="snippet">${item.snippet}</div>` : "";
+    li.innerHTML = `<strong>${escapeHtml(item.title || "(untitled)")}</strong><div class="meta">${escapeHtml(item.topic)} | #${escapeHtml(item.id)}</div>${snippet}`;
     li.onclick = () => loadDetail(item.id);
     listEl.appendChild(li);
   }
@@ -31,24 +39,41 @@ function safeJson(text) {
 }
 
 async function loadDetail(id) {
-  const data = await getJson(`/api/fatawa/${id}`);
+  const [data, related] = await Promise.all([
+    getJson(`/api/fatawa/${id}`),
+    getJson(`/api/fatawa/${id}/related`).catch(() => ({ items: [] })),
+  ]);
   const refs = safeJson(data.quran_references_json);
   const feedback = data.feedback || [];
   detailEl.innerHTML = `
-    <h2>${data.title || "(untitled)"}</h2>
-    <p class="meta">${data.topic} | ${data.madhhab || "unknown madhhab"} | <a href="${data.url}" target="_blank">source</a></p>
+    <h2>${escapeHtml(data.title || "(untitled)")}</h2>
+    <p class="meta">${escapeHtml(data.topic)} | ${escapeHtml(data.madhhab || "unknown madhhab")} | <a href="${escapeHtml(data.url)}" target="_blank">source</a></p>
     <h3>Question Summary</h3>
-    <p>${data.question_summary || ""}</p>
+    <p>${escapeHtml(data.question_summary)}</p>
     <h3>Draft Fatwa</h3>
-    <p>${data.draft_fatwa_text || ""}</p>
+    <p>${escapeHtml(data.draft_fatwa_text)}</p>
     <h3>Quran References</h3>
-    <p>${refs.join(", ")}</p>
+    <p>${refs.map((r) => `<a href="#" class="verse" data-ref="${escapeHtml(r)}">${escapeHtml(r)}</a>`).join(", ")}</p>
+    <h3>Related</h3>
+    <ul>${related.items.map((r) => `<li><a href="#" class="related" data-id="${escapeHtml(r.id)}">${escapeHtml(r.title || "(untitled)")}</a></li>`).join("")}</ul>
     <h3>Feedback</h3>
-    <ul>${feedback.map((x) => `<li>${x.comment}</li>`).join("")}</ul>
+    <ul>${feedback.map((x) => `<li>${escapeHtml(x.comment)}</li>`).join("")}</ul>
     <h3>Add Feedback</h3>
     <textarea id="fb-text" placeholder="Refinement note..."></textarea>
     <button id="fb-send">Submit</button>
   `;
+  for (const a of detailEl.querySelectorAll("a.verse")) {
+    a.onclick = (e) => {
+      e.preventDefault();
+      loadVerse(a.dataset.ref);
+    };
+  }
+  for (const a of detailEl.querySelectorAll("a.related")) {
+    a.onclick = (e) => {
+      e.preventDefault();
+      loadDetail(Number(a.dataset.id));
+    };
+  }
   document.getElementById("fb-send").onclick = async () => {
     const comment = document.getElementById("fb-text").value.trim();
     if (!comment) {
@@ -81,10 +106,17 @@ async function loadList() {
   if (topic) params.set("topic", topic);
   if (q) params.set("q", q);
   params.set("limit", "80");
+  params.set("total", "none");
+  params.set("canonical_only", "true");
   const data = await getJson(`/api/fatawa?${params.toString()}`);
   renderList(data.items || []);
 }
 
+async function loadVerse(ref) {
+  const data = await getJson(`/api/verses/${encodeURIComponent(ref)}/fatawa?limit=80`);
+  renderList(data.items || []);
+}
+
 reloadEl.onclick = () => loadList();
 topicEl.onchange = () => loadList();
 searchEl.onkeydown = (e) => {